@@ -0,0 +1,115 @@
+from __future__ import annotations
+from typing import Dict, Iterator
+
+import os
+from pathlib import Path
+from collections import Counter
+from contextlib import contextmanager
+
+LOG_ENV = "VORTEX_BENCH_LOG"
+DELAY_ENV = "VORTEX_BENCH_DELAY"
+
+_LOG = f'echo "$(basename "$0") $*" >> "${{{LOG_ENV}}}"'
+_DELAY = f'sleep "${{{DELAY_ENV}:-0}}"'
+
+# Stand-ins for external tools. Each of them logs its invocation and does the minimum for Vortex to proceed.
+SCRIPTS: Dict[str, str] = {
+    "gcc": f"""
+{_LOG}
+if [ "$1" = "-dumpmachine" ]; then echo "x86_64-linux-gnu"; exit 0; fi
+{_DELAY}
+""",
+    "make": f"""
+{_LOG}
+{_DELAY}
+if [ -f .install ]; then
+    install="$(cat .install)"
+    mkdir -p "$install/lib" "$install/bin"
+    echo "lib" > "$install/lib/libfake.so"
+    echo "bin" > "$install/bin/fake"
+fi
+""",
+    "cmake": f"""
+{_LOG}
+{_DELAY}
+""",
+    "rustup": f"""
+{_LOG}
+if [ "$1" = "show" ]; then echo "Default host: x86_64-unknown-linux-gnu"; fi
+""",
+    "cargo": f"""
+{_LOG}
+{_DELAY}
+if [ "$1" = "build" ] && [ -n "$CARGO_TARGET_DIR" ]; then
+    mkdir -p "$CARGO_TARGET_DIR/x86_64-unknown-linux-gnu/debug"
+    echo "bin" > "$CARGO_TARGET_DIR/x86_64-unknown-linux-gnu/debug/fake"
+fi
+""",
+    # Runs remote command locally: `ssh [-o opt] [-p port] host command...`
+    "ssh": f"""
+{_LOG}
+while [ $# -gt 0 ]; do
+    case "$1" in
+        -o|-p) shift 2 ;;
+        -*) shift ;;
+        *) break ;;
+    esac
+done
+shift
+exec sh -c "$*"
+""",
+    # Copies directory content ignoring filters: `rsync [options] src/ [host:]dst`.
+    # Like real rsync, copies to remote host through single call of the remote shell (`--rsh`).
+    "rsync": f"""
+{_LOG}
+rsh="ssh"
+while [ $# -gt 2 ]; do
+    case "$1" in
+        --rsh|-e) rsh="$2"; shift 2 ;;
+        --rsh=*) rsh="${{1#--rsh=}}"; shift ;;
+        *) shift ;;
+    esac
+done
+src="$1"
+dst="${{2#*:}}"
+if [ "$dst" != "$2" ]; then
+    $rsh "${{2%%:*}}" "mkdir -p '$dst' && cp -a '$src'. '$dst'"
+else
+    mkdir -p "$dst"
+    cp -a "$src". "$dst"
+fi
+""",
+}
+
+
+def install(bin_dir: Path) -> None:
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    for name, body in SCRIPTS.items():
+        path = bin_dir / name
+        path.write_text("#!/bin/sh\n" + body.lstrip())
+        path.chmod(0o755)
+
+
+@contextmanager
+def fake_tools(bin_dir: Path, delay: float = 0.0) -> Iterator[Path]:
+    "Puts fake tools first in `PATH`. Yields path of invocation log."
+    install(bin_dir)
+    log = bin_dir / "calls.log"
+    log.write_text("")
+    saved = {k: os.environ.get(k) for k in ["PATH", LOG_ENV, DELAY_ENV]}
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ['PATH']}"
+    os.environ[LOG_ENV] = str(log)
+    os.environ[DELAY_ENV] = str(delay)
+    try:
+        yield log
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                del os.environ[k]
+            else:
+                os.environ[k] = v
+
+
+def count_calls(log: Path) -> Dict[str, int]:
+    "Number of invocations of each fake tool."
+    return dict(Counter([line.split(" ", 1)[0] for line in log.read_text().splitlines() if line]))
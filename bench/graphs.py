@@ -0,0 +1,99 @@
+from __future__ import annotations
+from typing import Dict, List, Sequence, Set
+
+import os
+from pathlib import Path, PurePosixPath
+
+from vortex.utils.path import TargetPath
+from vortex.utils.run import run
+from vortex.tasks.base import Component, Context, DictGroup, Task, task
+from vortex.tasks.concurrent import ConcurrentTaskList
+from vortex.tasks.compiler import HOST_GCC
+from vortex.tasks.epics.base import EpicsProject
+
+
+class Node(Component):
+    "Synthetic task which calls its dependencies and optionally runs a fake build process."
+
+    def __init__(self, deps: Sequence[Node] = [], process: bool = False, parallel: bool = False) -> None:
+        super().__init__()
+        self.deps = list(deps)
+        self.process = process
+        self.parallel = parallel
+
+    @task
+    def build(self, ctx: Context) -> None:
+        if self.parallel and len(self.deps) > 1:
+            ConcurrentTaskList(*[d.build for d in self.deps])(ctx)
+        else:
+            for dep in self.deps:
+                dep.build(ctx)
+        if self.process:
+            run(["make"], quiet=True)
+
+
+def wide(width: int, process: bool = False) -> Node:
+    "Independent tasks run concurrently."
+    return Node([Node(process=process) for _ in range(width)], parallel=True)
+
+
+def deep(depth: int, process: bool = False) -> Node:
+    "Chain of tasks each depending on the previous one."
+    node = Node(process=process)
+    for _ in range(depth - 1):
+        node = Node([node], process=process)
+    return node
+
+
+def layered(width: int, depth: int, process: bool = False) -> Node:
+    "Layers of concurrent tasks where each task depends on every task of the previous layer."
+    layer: List[Node] = [Node(process=process) for _ in range(width)]
+    for _ in range(depth - 1):
+        layer = [Node(layer, process=process, parallel=True) for _ in range(width)]
+    return Node(layer, parallel=True)
+
+
+def group(root: Node) -> DictGroup:
+    "Component exposing every task of the graph by name as CLI does."
+    nodes: List[Node] = []
+    queue = [root]
+    seen: Set[int] = set()
+    while len(queue) > 0:
+        node = queue.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        nodes.append(node)
+        queue.extend(node.deps)
+    return DictGroup(**{f"n{i}": node for i, node in enumerate(nodes)})
+
+
+def names(comp: Component) -> Dict[Task, str]:
+    return {t: n for n, t in comp.tasks().items()}
+
+
+def source_tree(path: Path, files: int, fanout: int = 32) -> None:
+    "Creates tree of `files` small files, at most `fanout` entries per directory."
+    if path.exists():
+        return
+    dirs = [path]
+    while len(dirs) * fanout < files:
+        dirs = [d / f"d{i}" for d in dirs for i in range(fanout)]
+    tmp = path.with_name(path.name + ".tmp")
+    for i in range(files):
+        d = tmp / dirs[i % len(dirs)].relative_to(path)
+        if i < len(dirs):
+            d.mkdir(parents=True, exist_ok=True)
+        with open(d / f"f{i}.c", "w") as f:
+            f.write("int x;\n")
+    os.rename(tmp, path)
+
+
+class FakeEpicsProject(EpicsProject):
+    "EPICS project built by fake `make`, which installs a couple of files."
+
+    def __init__(self, src_dir: Path, target_dir: TargetPath) -> None:
+        super().__init__(src_dir, target_dir, HOST_GCC, PurePosixPath("/opt/fake"))
+
+    def _configure(self, ctx: Context) -> None:
+        (ctx.target_path / self.build_dir / ".install").write_text(str(ctx.target_path / self.install_dir))
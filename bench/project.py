@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import os
+import argparse
+from pathlib import Path
+
+from .graphs import group, layered
+from vortex.manage.cli import add_parser_args, read_run_params, setup_logging, run_with_params
+
+NODES_ENV = "VORTEX_BENCH_NODES"
+TARGET_ENV = "VORTEX_BENCH_TARGET"
+
+
+def main() -> None:
+    "Synthetic project with layered graph of `VORTEX_BENCH_NODES` tasks, used to measure CLI startup."
+    width = max(1, int(int(os.environ.get(NODES_ENV, "100")) ** 0.5))
+    comp = group(layered(width, width))
+
+    parser = argparse.ArgumentParser()
+    add_parser_args(parser, comp)
+    args = parser.parse_args()
+    params = read_run_params(args, comp, Path(os.environ[TARGET_ENV]))
+    setup_logging(params, ["vortex"])
+    run_with_params(params)
+
+
+if __name__ == "__main__":
+    main()
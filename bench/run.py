@@ -0,0 +1,235 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import os
+import sys
+import json
+import shutil
+import platform
+import argparse
+import tempfile
+import subprocess
+from time import perf_counter, time
+from pathlib import Path, PurePosixPath
+from statistics import median
+from contextlib import contextmanager, redirect_stdout
+
+from vortex.utils.path import TargetPath
+from vortex.tasks.base import Context, Runner
+from vortex.tasks.utils import tree_mod_time
+from vortex.output.base import Output
+from vortex.output.local import Local
+from vortex.output.ssh import SshOutput
+
+from . import fakes, graphs
+
+import logging
+
+Metrics = Dict[str, float]
+
+ROOT = Path(__file__).resolve().parents[1]
+
+DEEP_LIMIT = 100
+
+
+@contextmanager
+def _quiet() -> Iterator[None]:
+    "Hides task progress printed by runner."
+    with open(os.devnull, "w") as null, redirect_stdout(null):
+        yield
+
+
+def _measure(func: Callable[[], Any], repeat: int) -> float:
+    "The best time of `repeat` calls, in seconds."
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        with _quiet():
+            func()
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def _run_graph(root: graphs.Node, target: Path) -> Callable[[], None]:
+    comp = graphs.group(root)
+
+    def func() -> None:
+        shutil.rmtree(target, ignore_errors=True)
+        target.mkdir(parents=True)
+        ctx = Context(target)
+        ctx._names = graphs.names(comp)
+        Runner(root.build).run(ctx)
+
+    return func
+
+
+def bench_scheduler(work: Path, size: int, repeat: int) -> Dict[str, Metrics]:
+    "Overhead of running no-op tasks for different graph shapes."
+    width = max(1, int(size**0.5))
+    # Dependencies are called recursively, so chain length is limited by Python stack.
+    depth = min(size, DEEP_LIMIT)
+    shapes = {
+        "wide": (graphs.wide(size), size + 1),
+        "deep": (graphs.deep(depth), depth),
+        "layered": (graphs.layered(width, width), width * width + 1),
+    }
+    results: Dict[str, Metrics] = {}
+    for name, (root, count) in shapes.items():
+        seconds = _measure(_run_graph(root, work / "scheduler" / name), repeat)
+        results[name] = {"tasks": count, "seconds": seconds, "us_per_task": seconds / count * 1e6}
+    return results
+
+
+def bench_fanout(work: Path, size: int, repeat: int) -> Metrics:
+    "Throughput of concurrent tasks each running a (fake) build process."
+    seconds = _measure(_run_graph(graphs.wide(size, process=True), work / "fanout"), repeat)
+    return {"tasks": size, "seconds": seconds, "tasks_per_second": size / seconds}
+
+
+def bench_noop_rebuild(work: Path, files: int, repeat: int) -> Metrics:
+    "Cost of checking that project built from large source tree is up to date."
+    src = work / f"src-{files}"
+    graphs.source_tree(src, files)
+    target = work / "noop"
+    shutil.rmtree(target, ignore_errors=True)
+    target.mkdir()
+    project = graphs.FakeEpicsProject(src, TargetPath("noop"))
+
+    def build() -> None:
+        Runner(project.build).run(Context(target))
+
+    with _quiet():
+        build()
+    return {
+        "files": files,
+        "tree_mod_time_seconds": _measure(lambda: tree_mod_time(src), repeat),
+        "rebuild_seconds": _measure(build, repeat),
+    }
+
+
+def bench_deploy(work: Path, log: Path) -> Dict[str, Metrics]:
+    "Number of external commands (e.g. SSH round-trips) and time of deploying built project."
+    src = work / "src-deploy"
+    graphs.source_tree(src, 100)
+    target = work / "deploy"
+    shutil.rmtree(target, ignore_errors=True)
+    target.mkdir()
+    project = graphs.FakeEpicsProject(src, TargetPath("deploy"))
+    with _quiet():
+        Runner(project.build).run(Context(target))
+
+    outputs: Dict[str, Output] = {
+        "local": Local(work / "deploy-local"),
+        "ssh": SshOutput("bench", PurePosixPath(str(work / "deploy-ssh"))),
+    }
+    results: Dict[str, Metrics] = {}
+    for name, output in outputs.items():
+        log.write_text("")
+        start = perf_counter()
+        with _quiet():
+            Runner(project.deploy).run(Context(target, output=output))
+        seconds = perf_counter() - start
+        calls = fakes.count_calls(log)
+        results[name] = {"seconds": seconds, "commands": sum(calls.values()), **{f"{k}_calls": v for k, v in calls.items()}}
+    return results
+
+
+def bench_startup(work: Path, size: int, repeat: int) -> Metrics:
+    "Time from process start to listing tasks of the project and to finishing no-op task."
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join([str(ROOT), *filter(None, [os.environ.get("PYTHONPATH")])]),
+        "VORTEX_BENCH_NODES": str(size),
+        "VORTEX_BENCH_TARGET": str(work / "startup"),
+    }
+    script = ["-m", f"{__package__}.project"]
+
+    def call(*args: str) -> float:
+        times = []
+        for _ in range(repeat):
+            start = perf_counter()
+            subprocess.run([sys.executable, *args], env=env, check=True, stdout=subprocess.DEVNULL)
+            times.append(perf_counter() - start)
+        return median(times)
+
+    return {
+        "tasks": size,
+        "import_seconds": call("-c", "import vortex.manage.cli"),
+        "list_tasks_seconds": call(*script, "--list-tasks"),
+        "run_seconds": call(*script, "n0.build"),
+    }
+
+
+def _revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    "Prints metrics which exist in both results."
+
+    def flatten(prefix: str, value: Any) -> Dict[str, float]:
+        if isinstance(value, dict):
+            return {k: v for key, item in value.items() for k, v in flatten(f"{prefix}.{key}", item).items()}
+        return {prefix[1:]: float(value)}
+
+    before, after = flatten("", old["results"]), flatten("", new["results"])
+    print(f"Comparison with {old.get('revision')}:")
+    for key in sorted(before.keys() & after.keys()):
+        ratio = after[key] / before[key] if before[key] != 0.0 else float("nan")
+        print(f"  {key}: {before[key]:.6g} -> {after[key]:.6g} (x{ratio:.3f})")
+
+
+BENCHMARKS = ["scheduler", "fanout", "noop", "deploy", "startup"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks of Vortex itself with synthetic projects and fake tools.")
+    parser.add_argument("--work-dir", type=Path, default=Path(tempfile.gettempdir()) / "vortex-bench")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument("--tasks", type=int, default=1000, help="Number of tasks in synthetic graphs.")
+    parser.add_argument("--files", type=int, default=10000, help="Number of files in source tree (e.g. up to 1000000).")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path, default=None, help="Write results as JSON to this file.")
+    parser.add_argument("--compare", type=Path, default=None, help="Compare with results of previous version.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    work: Path = args.work_dir
+    work.mkdir(parents=True, exist_ok=True)
+
+    results: Dict[str, Any] = {}
+    with fakes.fake_tools(work / "bin") as log:
+        if "scheduler" in args.only:
+            results["scheduler"] = bench_scheduler(work, args.tasks, args.repeat)
+        if "fanout" in args.only:
+            results["fanout"] = bench_fanout(work, min(args.tasks, 200), args.repeat)
+        if "noop" in args.only:
+            results["noop"] = bench_noop_rebuild(work, args.files, args.repeat)
+        if "deploy" in args.only:
+            results["deploy"] = bench_deploy(work, log)
+        if "startup" in args.only:
+            results["startup"] = bench_startup(work, args.tasks, args.repeat)
+
+    report: Dict[str, Any] = {
+        "revision": _revision(),
+        "time": time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"tasks": args.tasks, "files": args.files, "repeat": args.repeat},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output is not None:
+        args.output.write_text(text + "\n")
+    print(text)
+    if args.compare is not None:
+        compare(json.loads(args.compare.read_text()), report)
+
+
+if __name__ == "__main__":
+    main()
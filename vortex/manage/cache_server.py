@@ -0,0 +1,107 @@
+from __future__ import annotations
+from typing import Optional
+
+import os
+import argparse
+import tempfile
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from vortex.utils.remote_cache import KEY_PATTERN
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CacheHandler(BaseHTTPRequestHandler):
+    "Serves `GET`, `HEAD` and `PUT` of `/<key>` entries stored in `root` directory of server."
+
+    server: CacheServer
+
+    def _path(self) -> Optional[Path]:
+        key = self.path.strip("/")
+        if not KEY_PATTERN.match(key):
+            self.send_error(400, "Key must be SHA-256 hex digest")
+            return None
+        return self.server.root / key[:2] / key
+
+    def _send_entry(self, body: bool) -> None:
+        path = self._path()
+        if path is None:
+            return
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            self.send_error(404)
+            return
+        with f:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/gzip")
+            self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+            self.end_headers()
+            if body:
+                for chunk in iter(lambda: f.read(0x100000), b""):
+                    self.wfile.write(chunk)
+
+    def do_GET(self) -> None:
+        self._send_entry(body=True)
+
+    def do_HEAD(self) -> None:
+        self._send_entry(body=False)
+
+    def do_PUT(self) -> None:
+        path = self._path()
+        if path is None:
+            return
+        size = int(self.headers.get("Content-Length", "-1"))
+        if size < 0:
+            self.send_error(411)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Entry appears atomically, so that concurrent readers never get a partial one.
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".put-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while size > 0:
+                    chunk = self.rfile.read(min(size, 0x100000))
+                    if not chunk:
+                        raise ConnectionError("Connection closed before end of entry")
+                    f.write(chunk)
+                    size -= len(chunk)
+            os.replace(tmp, path)
+        except:
+            os.unlink(tmp)
+            raise
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format: str, *args: object) -> None:
+        logger.info(f"{self.address_string()} {format % args}")
+
+
+class CacheServer(ThreadingHTTPServer):
+    "Simple content-addressed artifact cache to share task outputs between machines."
+
+    def __init__(self, root: Path, host: str, port: int) -> None:
+        super().__init__((host, port), CacheHandler)
+        self.root = root
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Remote cache server for task outputs (see `--cache-url`).")
+    parser.add_argument("--root", type=Path, required=True, help="Directory to store entries in.")
+    parser.add_argument("--host", type=str, default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8472)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    args.root.mkdir(parents=True, exist_ok=True)
+    with CacheServer(args.root, args.host, args.port) as server:
+        logger.info(f"Serving '{args.root}' at http://{args.host}:{args.port}")
+        server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,24 @@
 from __future__ import annotations
-from typing import Dict, List, Tuple, Optional
+from typing import Any, Dict, List, Sequence, Tuple, Optional
 
 import re
 import argparse
+from functools import partial
 from dataclasses import dataclass
 from pathlib import Path, PurePosixPath
-from colorama import init as colorama_init, Style
 
 from vortex.tasks.base import Context, Task, Component
 from vortex.utils.log import LogLevel
+from vortex.utils.string import parse_size
 from vortex.tasks.base import Runner
 from vortex.output.base import Output
-from vortex.output.local import Local
-from vortex.output.ssh import SshOutput, SshDevice
 
 import logging
 
 
 def _make_task_tree(tasks: List[str]) -> List[str]:
+    from colorama import Style
+
     output: List[str] = []
     groups: Dict[str, List[str]] = {}
     for task in tasks:
@@ -51,6 +52,9 @@ def _make_task_tree(tasks: List[str]) -> List[str]:
 
 
 def _available_tasks_text(comp: Component) -> str:
+    from colorama import init as colorama_init
+
+    colorama_init()
     return "\n".join(
         [
             "Available tasks:",
@@ -59,21 +63,46 @@ def _available_tasks_text(comp: Component) -> str:
     )
 
 
-def add_parser_args(parser: argparse.ArgumentParser, comp: Component) -> None:
-    colorama_init()
+class _HelpFormatter(argparse.RawTextHelpFormatter):
+    "Appends available tasks to the task argument help only when help is actually printed."
+
+    def __init__(self, prog: str, comp: Component) -> None:
+        super().__init__(prog)
+        self.comp = comp
+
+    def _get_help_string(self, action: argparse.Action) -> Optional[str]:
+        help = super()._get_help_string(action)
+        if action.dest == "task" and help is not None:
+            help = "\n".join([help, _available_tasks_text(self.comp).replace("%", "%%")])
+        return help
+
+
+class _ListTasksAction(argparse.Action):
+    "Prints plain list of task names (e.g. for shell completion) and exits."
+
+    def __init__(self, option_strings: Sequence[str], dest: str, comp: Component, **kws: Any) -> None:
+        super().__init__(option_strings, dest, nargs=0, **kws)
+        self.comp = comp
+
+    def __call__(self, parser: argparse.ArgumentParser, *args: Any) -> None:
+        print("\n".join(sorted(self.comp.tasks().keys())))
+        parser.exit()
 
-    parser.formatter_class = argparse.RawTextHelpFormatter
+
+def add_parser_args(parser: argparse.ArgumentParser, comp: Component) -> None:
+    parser.formatter_class = partial(_HelpFormatter, comp=comp)
 
     parser.add_argument(
         "task",
         type=str,
         metavar="<task>",
-        help="\n".join(
-            [
-                "Task you want to run.",
-                _available_tasks_text(comp),
-            ]
-        ),
+        help="Task you want to run.",
+    )
+    parser.add_argument(
+        "--list-tasks",
+        action=_ListTasksAction,
+        comp=comp,
+        help="Print names of all available tasks and exit.",
     )
     parser.add_argument(
         *["-t", "--target-dir"],
@@ -101,6 +130,51 @@ def add_parser_args(parser: argparse.ArgumentParser, comp: Component) -> None:
             ]
         ),
     )
+    parser.add_argument(
+        *["-k", "--keep-going"],
+        action="store_true",
+        help="Continue running tasks independent of failed ones and print all failures at the end.",
+    )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="\n".join(
+            [
+                "Run task in background Vortex server which keeps project state warm between invocations.",
+                "The server is started on demand and stops after being idle for a while.",
+            ]
+        ),
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="\n".join(
+            [
+                "Watch task sources and re-run tasks affected by their changes until interrupted.",
+                "Requires Linux (inotify).",
+            ]
+        ),
+    )
+    parser.add_argument(
+        "--explain",
+        action="store_true",
+        help="Print why each task was run or considered up to date.",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print critical path, parallel efficiency and the slowest tasks after the run.",
+    )
+    parser.add_argument(
+        "--profile-vortex",
+        action="store_true",
+        help="\n".join(
+            [
+                "Profile Python code of Vortex itself and print its hotspots after the run.",
+                "Statistics are stored in `.vortex/profile` of target directory in pstats format.",
+            ]
+        ),
+    )
     parser.add_argument(
         "--update",
         action="store_true",
@@ -116,7 +190,61 @@ def add_parser_args(parser: argparse.ArgumentParser, comp: Component) -> None:
         type=int,
         metavar="<N>",
         default=None,
-        help="Number of parallel process to build. By default automatically determined value is used.",
+        help="\n".join(
+            [
+                "Number of parallel process to build. By default automatically determined value is used.",
+                "Also limits number of tasks running concurrently, which are then started by their duration in previous runs.",
+                "Without it concurrent tasks are not limited.",
+            ]
+        ),
+    )
+    parser.add_argument(
+        "--memory-limit",
+        type=parse_size,
+        metavar="<SIZE>",
+        default=None,
+        help="\n".join(
+            [
+                "Memory budget (e.g. 12G) for tasks running concurrently.",
+                "Tasks are started only while their expected peak memory fits it, others wait in queue.",
+            ]
+        ),
+    )
+    parser.add_argument(
+        "--perf-frequency",
+        type=int,
+        metavar="<HZ>",
+        default=999,
+        help="Sampling frequency of `perf record` for processes run in profiler mode.",
+    )
+    parser.add_argument(
+        "--perf-call-graph",
+        # The same as `vortex.utils.perf.CALL_GRAPHS`, which is not imported at startup.
+        choices=["fp", "dwarf", "lbr"],
+        default="dwarf",
+        help="Call graph recording method of `perf record` for processes run in profiler mode.",
+    )
+    parser.add_argument(
+        "--cache-url",
+        type=str,
+        metavar="<URL>",
+        default=None,
+        help="\n".join(
+            [
+                "Remote cache of task outputs (e.g. toolchains and EPICS builds) to load them instead of building.",
+                "Server is run by `python -m vortex.manage.cache_server`.",
+            ]
+        ),
+    )
+    parser.add_argument(
+        "--cache-push",
+        action="store_true",
+        help="Store outputs of built tasks in remote cache (e.g. on CI).",
+    )
+    parser.add_argument(
+        "--no-prefetch",
+        action="store_true",
+        help="Don't start downloads and clones of toolchains and sources in advance, only when they are needed.",
     )
     parser.add_argument(
         "--log-level",
@@ -146,6 +274,10 @@ class RunParams:
     task: Task
     context: Context
     no_deps: bool
+    daemon: bool = False
+    watch: bool = False
+    component: Optional[Component] = None
+    args: Optional[argparse.Namespace] = None
 
 
 def _find_task_by_args(comp: Component, args: argparse.Namespace) -> Task:
@@ -164,6 +296,9 @@ def _make_context_from_args(args: argparse.Namespace, target_dir: Path) -> Conte
 
     output: Optional[Output] = None
     if args.output is not None:
+        from vortex.output.local import Local
+        from vortex.output.ssh import SshOutput, SshDevice
+
         match = re.match(r"^(\w+@)?([\w.-]+)?(:\d+)?(/.+)?$", args.output)
         assert match is not None, f"Wrong output format: '{args.output}'"
         user = match[1][:-1] if match[1] is not None else None
@@ -191,6 +326,16 @@ def _make_context_from_args(args: argparse.Namespace, target_dir: Path) -> Conte
         update=args.update,
         local=args.local,
         jobs=args.jobs,
+        keep_going=args.keep_going,
+        explain=args.explain,
+        timings=args.timings,
+        memory_limit=args.memory_limit,
+        profile_vortex=args.profile_vortex,
+        perf_frequency=args.perf_frequency,
+        perf_call_graph=args.perf_call_graph,
+        cache_url=args.cache_url,
+        cache_push=args.cache_push,
+        prefetch=not args.no_prefetch,
     )
 
 
@@ -201,9 +346,15 @@ def read_run_params(args: argparse.Namespace, comp: Component, target_dir: Path)
         print(e)
         exit(1)
 
+    if args.watch and args.daemon:
+        print("Watch mode cannot be run in daemon.")
+        exit(1)
+
     context = _make_context_from_args(args, target_dir)
+    # Names are also used as keys of task history.
+    context._names = {t: n for n, t in comp.tasks().items()}
 
-    return RunParams(task, context, no_deps=args.no_deps)
+    return RunParams(task, context, no_deps=args.no_deps, daemon=args.daemon, watch=args.watch, component=comp, args=args)
 
 
 def setup_logging(params: RunParams, modules: List[str]) -> None:
@@ -215,4 +366,14 @@ def setup_logging(params: RunParams, modules: List[str]) -> None:
 
 
 def run_with_params(params: RunParams) -> None:
-    Runner(params.task).run(params.context, no_deps=params.no_deps)
+    if params.daemon:
+        from vortex.manage.daemon import run_in_daemon
+
+        assert params.component is not None and params.args is not None
+        run_in_daemon(params.component, params.args, params.context.target_path)
+    elif params.watch:
+        from vortex.manage.watch import watch
+
+        watch(params.task, params.context, no_deps=params.no_deps)
+    else:
+        Runner(params.task).run(params.context, no_deps=params.no_deps)
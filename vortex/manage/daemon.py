@@ -0,0 +1,321 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+
+import os
+import sys
+import json
+import socket
+import struct
+import argparse
+import sysconfig
+import traceback
+from time import sleep
+from hashlib import sha1
+from pathlib import Path
+from threading import Thread
+
+from vortex.utils.path import runtime_dir
+from vortex.tasks.base import Component
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+IDLE_TIMEOUT = 600.0
+"Server stops if there were no requests during this time, in seconds."
+
+CONNECT_TIMEOUT = 10.0
+"Time to wait for just started server to accept connections, in seconds."
+
+_STDIO = [0, 1, 2]
+
+
+def socket_path(target_dir: Path) -> Path:
+    # Unix socket path length is limited, so it cannot be placed inside arbitrary target directory.
+    digest = sha1(str(target_dir.resolve()).encode()).hexdigest()[:16]
+    return runtime_dir() / f"{digest}.sock"
+
+
+def _check_peer(conn: socket.socket) -> None:
+    "Both server and client pass standard streams over socket, so they must belong to the same user."
+    if not hasattr(socket, "SO_PEERCRED"):
+        # Socket directory is still private.
+        return
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _, uid, _ = struct.unpack("3i", creds)
+    if uid != os.getuid():
+        raise PermissionError(f"Other side of Vortex server socket belongs to other user (uid {uid})")
+
+
+def _sources() -> Dict[str, float]:
+    "Modification times of loaded modules except standard library and installed packages."
+    skip = tuple({sysconfig.get_path(k) for k in ["stdlib", "platstdlib", "purelib", "platlib"]})
+    sources: Dict[str, float] = {}
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None)
+        if path is None or path.startswith(skip):
+            continue
+        try:
+            sources[path] = os.stat(path).st_mtime
+        except OSError:
+            continue
+    return sources
+
+
+def _fingerprint() -> str:
+    "Identifies project, so that a server of other project script is restarted."
+    main = sys.modules["__main__"]
+    path = Path(getattr(main, "__file__", None) or sys.argv[0]).resolve()
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        mtime = 0.0
+    return f"{path}:{mtime}"
+
+
+def _read_message(conn: socket.socket) -> Dict[str, Any]:
+    data = b""
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(0x10000)
+        if not chunk:
+            raise ConnectionError("Connection closed before message end")
+        data += chunk
+    message: Dict[str, Any] = json.loads(data)
+    return message
+
+
+def _write_message(conn: socket.socket, message: Dict[str, Any]) -> None:
+    conn.sendall(json.dumps(message).encode() + b"\n")
+
+
+class Server:
+    "Long-running process which keeps component graph and toolchain state warm between CLI invocations."
+
+    def __init__(self, comp: Component, target_dir: Path, idle_timeout: float = IDLE_TIMEOUT) -> None:
+        self.comp = comp
+        self.target_dir = target_dir
+        self.idle_timeout = idle_timeout
+        self.fingerprint = _fingerprint()
+        self.sources = _sources()
+
+    def _outdated(self) -> bool:
+        "Whether any of project or Vortex modules loaded by the server is changed since it started."
+        for path, mtime in self.sources.items():
+            try:
+                if os.stat(path).st_mtime != mtime:
+                    return True
+            except FileNotFoundError:
+                return True
+        return False
+
+    def serve(self) -> None:
+        path = socket_path(self.target_dir)
+        path.unlink(missing_ok=True)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.bind(str(path))
+            sock.listen()
+            sock.settimeout(self.idle_timeout)
+            logger.info(f"Vortex server is listening on '{path}'")
+            try:
+                while True:
+                    try:
+                        conn, _ = sock.accept()
+                    except socket.timeout:
+                        logger.info("Vortex server is idle, stopping")
+                        break
+                    with conn:
+                        conn.settimeout(None)
+                        try:
+                            _check_peer(conn)
+                            if not self._handle(conn):
+                                break
+                        except (OSError, ValueError) as e:
+                            logger.warning(f"Failed to handle request: {e}")
+            finally:
+                path.unlink(missing_ok=True)
+
+    def _handle(self, conn: socket.socket) -> bool:
+        "Returns `False` if server should stop."
+        msg, fds, _, _ = socket.recv_fds(conn, 0x10000, len(_STDIO))
+        while not msg.endswith(b"\n"):
+            msg += conn.recv(0x10000)
+        request = json.loads(msg)
+
+        fingerprint = request.get("fingerprint")
+        if (fingerprint is not None and fingerprint != self.fingerprint) or self._outdated():
+            for fd in fds:
+                os.close(fd)
+            _write_message(conn, {"restart": True})
+            return False
+
+        # Run task with standard streams of the client, so that both Vortex and child processes write directly to them.
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved = [os.dup(fd) for fd in _STDIO]
+        for src, dst in zip(fds, _STDIO):
+            os.dup2(src, dst)
+            os.close(src)
+        # Environment and working directory of the client are used by tasks and processes they run.
+        saved_env = dict(os.environ)
+        saved_cwd = os.getcwd()
+        os.environ.clear()
+        os.environ.update(request["env"])
+        try:
+            os.chdir(request["cwd"])
+            code = self._run(conn, request)
+        finally:
+            os.chdir(saved_cwd)
+            os.environ.clear()
+            os.environ.update(saved_env)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            for src, dst in zip(saved, _STDIO):
+                os.dup2(src, dst)
+                os.close(src)
+
+        _write_message(conn, {"code": code})
+        return True
+
+    def _run(self, conn: socket.socket, request: Dict[str, Any]) -> int:
+        from vortex.manage.cli import add_parser_args, read_run_params, run_with_params
+
+        try:
+            if "argv" in request:
+                # Command line of thin client is parsed by the server, because only it knows the tasks.
+                parser = argparse.ArgumentParser(prog="vortex")
+                add_parser_args(parser, self.comp)
+                args = parser.parse_args(request["argv"])
+            else:
+                args = argparse.Namespace(**request["args"])
+            args.daemon = False
+            params = read_run_params(args, self.comp, self.target_dir)
+
+            def watch_client() -> None:
+                # Client closes connection when interrupted.
+                try:
+                    conn.recv(1)
+                except OSError:
+                    pass
+                params.context._running = False
+
+            Thread(target=watch_client, daemon=True).start()
+            run_with_params(params)
+        except SystemExit as e:
+            # Same as interpreter does on exit.
+            if e.code is None:
+                return 0
+            if isinstance(e.code, int):
+                return e.code
+            print(e.code, file=sys.stderr)
+            return 1
+        except BaseException:
+            traceback.print_exc()
+            return 1
+        return 0
+
+
+def _spawn(comp: Component, target_dir: Path) -> None:
+    "Forks current process (which already has component graph built) into background server."
+    log_path = target_dir / ".vortex" / "daemon.log"
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    if os.fork() != 0:
+        return
+    try:
+        os.setsid()
+        null = os.open(os.devnull, os.O_RDONLY)
+        log = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        os.dup2(null, 0)
+        os.dup2(log, 1)
+        os.dup2(log, 2)
+        Server(comp, target_dir).serve()
+    except BaseException:
+        traceback.print_exc()
+    finally:
+        os._exit(0)
+
+
+def _connect(path: Path, timeout: float) -> Optional[socket.socket]:
+    for _ in range(max(1, int(timeout / 0.05))):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(str(path))
+            _check_peer(sock)
+            return sock
+        except (FileNotFoundError, ConnectionRefusedError):
+            sock.close()
+            if timeout <= 0.0:
+                break
+            sleep(0.05)
+        except:
+            sock.close()
+            raise
+    return None
+
+
+def _request(conn: socket.socket, request: Dict[str, Any]) -> Dict[str, Any]:
+    "Sends request with standard streams, environment and working directory of the client and waits for reply."
+    payload = [json.dumps({**request, "env": dict(os.environ), "cwd": os.getcwd()}).encode() + b"\n"]
+    with conn:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        socket.send_fds(conn, payload, _STDIO)
+        return _read_message(conn)
+
+
+def _wait_released(path: Path) -> None:
+    "Waits for the outdated server to release socket."
+    for _ in range(int(CONNECT_TIMEOUT / 0.05)):
+        if not path.exists():
+            break
+        sleep(0.05)
+
+
+def run_in_daemon(comp: Component, args: argparse.Namespace, target_dir: Path) -> None:
+    "Forwards task to the server for `target_dir` starting it if needed."
+    path = socket_path(target_dir)
+    request: Dict[str, Any] = {"fingerprint": _fingerprint(), "args": vars(args)}
+
+    for _ in range(2):
+        conn = _connect(path, 0.0)
+        if conn is None:
+            _spawn(comp, target_dir)
+            conn = _connect(path, CONNECT_TIMEOUT)
+            if conn is None:
+                raise RuntimeError(f"Cannot connect to Vortex server at '{path}'")
+        reply = _request(conn, request)
+        if reply.get("restart", False):
+            logger.info("Vortex server runs outdated code, restarting")
+            _wait_released(path)
+            continue
+        code: int = reply["code"]
+        if code != 0:
+            raise SystemExit(code)
+        return
+    raise RuntimeError("Vortex server keeps rejecting requests")
+
+
+def main() -> None:
+    "Thin client which forwards command line to already running server without importing the project."
+    parser = argparse.ArgumentParser(
+        description="Run task in Vortex server of target directory started by project script with `--daemon`.",
+        usage="python -m vortex.manage.daemon <target-dir> <task> [options]",
+    )
+    parser.add_argument("target_dir", type=Path)
+    parser.add_argument("argv", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    path = socket_path(args.target_dir)
+    conn = _connect(path, 0.0)
+    if conn is None:
+        sys.exit(f"No Vortex server for '{args.target_dir}', run task by project script with `--daemon` to start it")
+    reply = _request(conn, {"argv": ["--target-dir", str(args.target_dir.resolve()), *args.argv]})
+    if reply.get("restart", False):
+        _wait_released(path)
+        sys.exit("Vortex server runs outdated code and is stopped, run task by project script with `--daemon`")
+    sys.exit(reply["code"])
+
+
+if __name__ == "__main__":
+    main()
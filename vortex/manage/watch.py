@@ -0,0 +1,75 @@
+from __future__ import annotations
+from typing import Collection, List, Set
+
+import traceback
+from pathlib import Path
+
+from vortex.tasks.base import Context, Runner, Task
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE = 0.3
+"Changes are collected until there are no new ones during this time, in seconds."
+
+
+def _contains(root: Path, path: Path) -> bool:
+    return path == root or root in path.parents
+
+
+def _affected(ctx: Context, tasks: Collection[Task], changed: Collection[Path]) -> Set[Task]:
+    "Tasks which sources are changed and all tasks which depend on them."
+    affected: Set[Task] = set()
+    for task in tasks:
+        if any(_contains(root, path) for root in task.watch_paths(ctx) for path in changed):
+            affected.add(task)
+
+    queue = list(affected)
+    while len(queue) > 0:
+        for caller in ctx._callers.get(queue.pop(), ()):
+            if caller not in affected:
+                affected.add(caller)
+                queue.append(caller)
+    return affected
+
+
+def watch(task: Task, ctx: Context, no_deps: bool = False, debounce: float = DEBOUNCE) -> None:
+    "Runs `task` and then re-runs tasks affected by changes in their sources until interrupted."
+    from vortex.utils.inotify import Inotify
+
+    runner = Runner(task)
+    known: Set[Task] = set()
+    completed: Set[Task] = set()
+    roots: Set[Path] = set()
+
+    with Inotify() as inotify:
+        while True:
+            try:
+                runner.run(ctx, no_deps=no_deps, completed=completed)
+            except Exception:
+                traceback.print_exc()
+            for t, flight in ctx._flights.items():
+                known.add(t)
+                if flight.done() and flight.exception() is None:
+                    completed.add(t)
+                else:
+                    completed.discard(t)
+
+            # Build artifacts must not trigger rebuild even if target directory is inside sources.
+            for t in known:
+                for root in t.watch_paths(ctx):
+                    if root not in roots:
+                        roots.add(root)
+                        inotify.watch_tree(root, exclude=[ctx.target_path])
+            print(f"Watching {len(roots)} source paths for changes ...")
+
+            while True:
+                changed = inotify.wait_changes(debounce)
+                logger.debug(f"Changed paths: {sorted(changed)}")
+                affected = _affected(ctx, known, changed)
+                if task in affected or task not in completed:
+                    break
+            names: List[str] = sorted(t.name() for t in affected)
+            print(f"Sources changed, re-running: {', '.join(names)}")
+            completed -= affected
@@ -6,6 +6,7 @@ from subprocess import Popen
 from pathlib import Path, PurePosixPath
 
 from vortex.utils.run import run, RunError
+from vortex.utils.path import runtime_dir
 from vortex.utils.string import quote
 from vortex.output.base import Connection, Output, Device
 
@@ -36,12 +37,21 @@ class SshOutput(Output):
         self.path = path
         self.user = user if user is not None else "root"
         self.port = port if port is not None else 22
+        self.control_persist = 600
 
     def name(self) -> str:
         return f"{self.user}@{self.host}:{self.port}{self.path}"
 
+    def _options(self) -> List[str]:
+        "Reuse single master connection for all commands instead of connecting each time."
+        return [
+            *["-o", "ControlMaster=auto"],
+            *["-o", f"ControlPath={runtime_dir()}/ssh-%C"],
+            *["-o", f"ControlPersist={self.control_persist}"],
+        ]
+
     def _prefix(self) -> List[str]:
-        return ["ssh", "-p", str(self.port), f"{self.user}@{self.host}"]
+        return ["ssh", *self._options(), "-p", str(self.port), f"{self.user}@{self.host}"]
 
     def _full_path(self, path: PurePosixPath) -> PurePosixPath:
         return self.path / path.relative_to(PurePosixPath("/"))
@@ -75,7 +85,7 @@ class SshOutput(Output):
                     *["--exclude=" + mask for mask in exclude],
                     "--progress",
                     "--rsh",
-                    f"ssh -p {self.port}",
+                    " ".join(["ssh", *self._options(), "-p", str(self.port)]),
                     f"{src}/",
                     f"{self.user}@{self.host}:{full_path}",
                 ]
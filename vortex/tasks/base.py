@@ -1,15 +1,73 @@
 from __future__ import annotations
-from typing import Callable, TypeVar, Any, Dict, overload, Optional, ContextManager, Set, List, Generator
-
+from typing import (
+    Callable,
+    TypeVar,
+    Any,
+    ClassVar,
+    Collection,
+    Dict,
+    overload,
+    Optional,
+    ContextManager,
+    List,
+    Generator,
+    Iterator,
+    Set,
+    Tuple,
+    TYPE_CHECKING,
+)
+
+import re
+import sys
+import threading
+from collections import deque
 from pathlib import Path
 from dataclasses import dataclass, field
+from types import FunctionType
 from inspect import signature, Parameter
-from contextlib import contextmanager
+from time import perf_counter
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import Future
 
 from vortex.utils.log import LogLevel
+from vortex.utils.gate import PriorityGate
+from vortex.utils.lock import FileLock
+from vortex.utils.run import ProcessUsage, cancel_scope, usage_scope
 from vortex.output.base import Output
 
-from colorama import init as colorama_init, Fore, Style
+if TYPE_CHECKING:
+    from vortex.utils.pyprofile import PyProfiler
+    from vortex.tasks.timing import History
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class TaskTiming:
+    start: float
+    end: float = 0.0
+    worker: str = ""
+    waited: float = 0.0
+    "Time spent waiting for dependencies."
+    usage: ProcessUsage = field(default_factory=ProcessUsage)
+    "Resources used by processes run by the task itself."
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    @property
+    def self_time(self) -> float:
+        return max(0.0, self.duration - self.waited)
+
+
+@dataclass
+class _SharedLock:
+    lock: FileLock
+    users: int = 0
+    mutex: threading.Lock = field(default_factory=threading.Lock)
 
 
 @dataclass
@@ -20,16 +78,228 @@ class Context:
     update: bool = False
     local: bool = False
     jobs: Optional[int] = None
+    "Limit of concurrently running tasks and processes. Without it branches are not limited, so their priority doesn't matter."
+    keep_going: bool = False
+    explain: bool = False
+    timings: bool = False
+    memory_limit: Optional[int] = None
+    "Memory budget for concurrently running tasks, in bytes."
+    profile_vortex: bool = False
+    "Profile Python code of Vortex itself."
+    perf_frequency: int = 999
+    "Sampling frequency of processes run in profiler mode, in Hz."
+    perf_call_graph: str = "dwarf"
+    "Call graph recording method of `perf record`: `fp`, `dwarf` or `lbr`."
+    cache_url: Optional[str] = None
+    "URL of remote cache of task outputs."
+    cache_push: bool = False
+    "Store outputs of tasks in remote cache, not only load them."
+    prefetch: bool = True
+    "Start downloads and clones required by the task in background at the beginning of run."
 
     _running: bool = True
-    _stack: List[Task] = field(default_factory=list)
-    _visited: Set[Task] = field(default_factory=set)
+    _local: threading.local = field(default_factory=threading.local)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+    _flights: Dict[Task, Future[None]] = field(default_factory=dict)
     _guard: Optional[Callable[[Task, Context], ContextManager[None]]] = None
     _no_deps: bool = False
+    _reports: Dict[str, Callable[[Context], None]] = field(default_factory=dict)
+    _failed: List[Tuple[Task, BaseException]] = field(default_factory=list)
+    _skipped: List[Tuple[Task, Task]] = field(default_factory=list)
+    _decisions: Dict[Task, str] = field(default_factory=dict)
+    _timings: Dict[Task, TaskTiming] = field(default_factory=dict)
+    _estimates: Dict[str, float] = field(default_factory=dict)
+    _gate: PriorityGate = field(default_factory=lambda: PriorityGate(sys.maxsize))
+    _memory: Optional[PriorityGate] = None
+    _peaks: Dict[str, int] = field(default_factory=dict)
+    _profiler: Optional[PyProfiler] = None
+    # Locks shared with other processes, held while any thread of this process runs task with the key.
+    _file_locks: Dict[str, _SharedLock] = field(default_factory=dict)
+    # Names to display tasks with, e.g. ones given in command line.
+    _names: Dict[Task, str] = field(default_factory=dict)
+    # Paths of components from named tasks by attributes (by `id`, because some components are not hashable).
+    _paths: Dict[int, str] = field(default_factory=dict)
+    # Unlike other runtime state, it is kept between runs, because completed tasks don't call their dependencies again.
+    _callers: Dict[Task, Set[Task]] = field(default_factory=dict)
 
     @property
     def capture(self) -> bool:
-        return self.log_level > LogLevel.INFO
+        "Output of processes is captured and printed only on failure. Background threads don't print over tasks output."
+        return self.log_level > LogLevel.INFO or getattr(self._local, "background", False)
+
+    @property
+    def state_path(self) -> Path:
+        "Directory for Vortex own state (locks, caches, history) inside target directory."
+        return self.target_path / ".vortex"
+
+    @property
+    def _stack(self) -> List[Task]:
+        "Call stack of tasks. Each thread has its own one."
+        try:
+            stack: List[Task] = self._local.stack
+        except AttributeError:
+            stack = []
+            self._local.stack = stack
+        return stack
+
+    @_stack.setter
+    def _stack(self, stack: List[Task]) -> None:
+        self._local.stack = stack
+
+    @property
+    def _frames(self) -> List[TaskTiming]:
+        "Timings of tasks being executed in current thread."
+        try:
+            frames: List[TaskTiming] = self._local.frames
+        except AttributeError:
+            frames = []
+            self._local.frames = frames
+        return frames
+
+    @contextmanager
+    def _measure(self, task: Task) -> Generator[None, None, None]:
+        timing = TaskTiming(perf_counter(), worker=threading.current_thread().name)
+        with self._lock:
+            self._timings[task] = timing
+        frames = self._frames
+        frames.append(timing)
+        try:
+            yield
+        finally:
+            frames.pop()
+            timing.end = perf_counter()
+            self._waited(timing.duration)
+
+    def _add_usage(self, task: Task, usage: ProcessUsage) -> None:
+        with self._lock:
+            timing = self._timings.get(task)
+            if timing is not None:
+                timing.usage.add(usage)
+
+    def _waited(self, seconds: float) -> None:
+        "Excludes time spent on dependencies from self time of the task being executed in current thread."
+        frames = self._frames
+        if len(frames) > 0:
+            frames[-1].waited += seconds
+
+    def decide(self, decision: str) -> None:
+        "Records why current task does its work or why it is up to date."
+        stack = self._stack
+        task = stack[-1]
+        logger.debug(f"{self._name(task)}: {decision}")
+        with self._lock:
+            self._decisions[task] = decision
+            # Overriding tasks which call base implementation via `super()` share its decision.
+            if isinstance(task, BoundedTask):
+                for caller in reversed(stack[:-1]):
+                    if not isinstance(caller, BoundedTask) or caller.owner is not task.owner:
+                        break
+                    self._decisions.setdefault(caller, decision)
+
+    def _estimate(self, task: Task) -> float:
+        "Expected task duration including its dependencies. Tasks which never run before are estimated as instant."
+        return self._estimates.get(self._key(task), 0.0)
+
+    def _memory_estimate(self, task: Task) -> int:
+        "Expected peak memory of task processes: declared by task or learned from previous runs."
+        declared = task.memory(self)
+        if declared is not None:
+            return declared
+        return self._peaks.get(self._key(task), 0)
+
+    @contextmanager
+    def _admit(self, task: Task) -> Generator[None, None, None]:
+        "Waits until there is enough memory budget for the task and reserves it."
+        amount = self._memory_estimate(task) if self._memory is not None else 0
+        if self._memory is None or amount <= 0:
+            yield
+            return
+        with self._memory.slot(self._estimate(task), amount):
+            yield
+
+    @contextmanager
+    def _locked(self, task: Task) -> Generator[None, None, None]:
+        "Waits until other Vortex processes using the same target directory finish tasks with the same lock key."
+        key = task.lock_key(self)
+        if key is None:
+            yield
+            return
+        with self._lock:
+            shared = self._file_locks.get(key)
+            if shared is None:
+                name = re.sub(r"[^\w.-]+", "_", key)
+                shared = self._file_locks[key] = _SharedLock(FileLock(self.state_path / "locks" / f"{name}.lock"))
+            shared.users += 1
+        try:
+            # Threads of this process are coordinated by single-flight, so the lock is only acquired once.
+            with shared.mutex:
+                if not shared.lock.acquired and not shared.lock.try_acquire():
+                    with self._gate.released():
+                        shared.lock.acquire()
+            yield
+        finally:
+            with self._lock:
+                shared.users -= 1
+                if shared.users == 0:
+                    del self._file_locks[key]
+                    if shared.lock.acquired:
+                        shared.lock.release()
+
+    def _suspend(self) -> ContextManager[None]:
+        "Frees memory reserved by current task while it calls its dependency."
+        return self._memory.released() if self._memory is not None else nullcontext()
+
+    def _profiled(self) -> ContextManager[None]:
+        "Profiles current thread if requested."
+        return self._profiler.thread() if self._profiler is not None else nullcontext()
+
+    def _name(self, task: Task) -> str:
+        name = self._names.get(task)
+        if name is not None:
+            return name
+        if isinstance(task, BoundedTask):
+            # Base implementation called via `super()` is named after overriding task.
+            for caller in self._callers.get(task, ()):
+                if isinstance(caller, BoundedTask) and caller.owner is task.owner and caller in self._names:
+                    return f"{self._names[caller]}/{task.name()}"
+        return task.name()
+
+    def _key(self, task: Task) -> str:
+        "Identity of task which is stable between runs, e.g. for history. Unlike name, it differs for each instance."
+        name = self._names.get(task)
+        if name is not None:
+            return name
+        if isinstance(task, BoundedTask):
+            path = self._paths.get(id(task.owner))
+            if path is not None:
+                return f"{path}:{task.name()}"
+        return task.name()
+
+    def _take_flight(self, task: Task) -> Tuple[Future[None], bool]:
+        "Returns task execution result and whether the caller is the one who must execute the task."
+        with self._lock:
+            try:
+                return (self._flights[task], False)
+            except KeyError:
+                flight: Future[None] = Future()
+                self._flights[task] = flight
+                return (flight, True)
+
+    def _add_caller(self, task: Task) -> None:
+        "Records that the task being executed in current thread calls `task`."
+        stack = self._stack
+        if len(stack) > 0:
+            with self._lock:
+                self._callers.setdefault(task, set()).add(stack[-1])
+
+    def _record_failure(self, task: Task, error: BaseException) -> None:
+        "Distinguishes tasks failed by themselves from ones failed because of their dependencies."
+        with self._lock:
+            for failed, e in self._failed:
+                if e is error:
+                    self._skipped.append((task, failed))
+                    return
+            self._failed.append((task, error))
 
 
 class Task:
@@ -37,53 +307,128 @@ class Task:
         raise NotImplementedError()
 
     def __call__(self, ctx: Context, *args: Any, **kws: Any) -> None:
-        if ctx._no_deps:
-            if len(ctx._stack) > 0 and self != ctx._stack[-1]:
-                return
-        else:
-            if self in ctx._visited:
-                return
+        stack = ctx._stack
+        if len(stack) > 0 and stack[-1] == self:
+            # Task calls itself directly.
+            self._execute(ctx, *args, **kws)
+            return
 
-        if len(ctx._stack) > 0 and self in ctx._stack and ctx._stack[-1] != self:
+        if self in stack:
             raise RuntimeError(f"Task dependency cycle detected for {self}")
+        ctx._add_caller(self)
+        if ctx._no_deps and len(stack) > 0:
+            return
+
+        with ctx._suspend():
+            # Only one thread executes the task, others wait for its result.
+            flight, owner = ctx._take_flight(self)
+            if not owner:
+                start = perf_counter()
+                try:
+                    with ctx._gate.released():
+                        flight.result()
+                finally:
+                    ctx._waited(perf_counter() - start)
+                return
 
+            try:
+                with ctx._measure(self), ctx._locked(self), ctx._admit(self):
+                    self._execute(ctx, *args, **kws)
+            except BaseException as e:
+                flight.set_exception(e)
+                ctx._record_failure(self, e)
+                raise
+            else:
+                flight.set_result(None)
+
+    def _execute(self, ctx: Context, *args: Any, **kws: Any) -> None:
         assert ctx._guard is not None
-        with ctx._guard(self, ctx):
+        with ctx._guard(self, ctx), cancel_scope(lambda: ctx._running), usage_scope(lambda u: ctx._add_usage(self, u)):
             ctx._stack.append(self)
             try:
                 self.run(ctx, *args, **kws)
             finally:
                 ctx._stack.pop()
 
-        ctx._visited.add(self)
-
     def run(self, ctx: Context, *args: Any, **kws: Any) -> None:
         raise NotImplementedError()
 
+    def watch_paths(self, ctx: Context) -> List[Path]:
+        "Source paths which the task result depends on. Task is re-run in watch mode when they change."
+        return []
+
+    def memory(self, ctx: Context) -> Optional[int]:
+        "Expected peak memory of the task processes in bytes. If `None` then value from previous runs is used."
+        return None
+
+    def lock_key(self, ctx: Context) -> Optional[str]:
+        "Task is not run concurrently with tasks with the same key in other processes using the same target directory."
+        return None
+
 
 class Component:
+    _class_tasks: ClassVar[Dict[str, UnboundedTask | Task]] = {}
+    _task_descriptors: ClassVar[List[str]] = []
+
+    def __init_subclass__(cls, **kws: Any) -> None:
+        "Collects class tasks once at class creation, so that `tasks()` doesn't need to scan attributes."
+        super().__init_subclass__(**kws)
+        attrs: Dict[str, Any] = {}
+        for base in reversed(cls.__mro__):
+            attrs.update({k: v for k, v in vars(base).items() if not k.startswith("__")})
+        cls._class_tasks = {k: v for k, v in attrs.items() if isinstance(v, (UnboundedTask, Task))}
+        # Properties and other descriptors may return tasks, so they are still evaluated on each call.
+        cls._task_descriptors = [
+            k
+            for k, v in attrs.items()
+            if hasattr(type(v), "__get__") and not isinstance(v, (UnboundedTask, Task, FunctionType, classmethod, staticmethod))
+        ]
+
     def tasks(self) -> Dict[str, Task]:
         names: Dict[Task, str] = {}
-        for name, task in {k: getattr(self, k) for k in dir(self)}.items():
-            if isinstance(task, Task):
+        for name, task in vars(self).items():
+            if isinstance(task, Task) and not name.startswith(UnboundedTask.BOUNDED_PREFIX):
                 names[task] = name
-        for name, unb_task in {k: getattr(self.__class__, k) for k in dir(self.__class__)}.items():
-            if isinstance(unb_task, UnboundedTask):
-                task = unb_task.__get__(self)
+        for name in self._task_descriptors:
+            task = getattr(self, name, None)
+            if isinstance(task, Task):
                 names[task] = name
+        for name, class_task in self._class_tasks.items():
+            task = class_task.__get__(self) if isinstance(class_task, UnboundedTask) else class_task
+            names[task] = name
         return {v: k for k, v in names.items()}
 
+    def watch_paths(self, ctx: Context) -> List[Path]:
+        "Source paths of the component. Used by all its tasks."
+        return []
+
+    def memory(self, ctx: Context) -> Optional[int]:
+        "Expected peak memory of the component tasks in bytes."
+        return None
+
+    def lock_key(self, ctx: Context, task: str) -> Optional[str]:
+        "Lock key of the component task named `task`, e.g. output directory it modifies. Tasks only using outputs have none."
+        return None
+
+    def prefetch_tasks(self, ctx: Context) -> List[Task]:
+        "Network-bound tasks (downloads, clones) which are started in advance if the component is reachable from root task."
+        return []
+
 
 @dataclass
 class Runner:
     task: Task
 
     def __post_init__(self) -> None:
+        from colorama import init as colorama_init
+
         colorama_init()
 
     @staticmethod
     @contextmanager
     def _with_info(task: Task, ctx: Context) -> Generator[None, None, None]:
+        from colorama import Fore, Style
+
         tab = " " * len(set(ctx._stack))
         print(f"{tab}{Style.BRIGHT + Fore.WHITE}{task.name()}{Style.NORMAL} started ...{Style.RESET_ALL}")
         try:
@@ -94,16 +439,150 @@ class Runner:
         else:
             print(f"{tab}{Style.BRIGHT + Fore.GREEN}{task.name()}{Style.NORMAL} done{Style.RESET_ALL}")
 
-    def run(self, ctx: Context, no_deps: bool = False) -> None:
+    @staticmethod
+    def _print_failures(ctx: Context, root: Task) -> None:
+        from colorama import Fore, Style
+
+        if len(ctx._failed) == 0:
+            return
+        print(f"{Style.BRIGHT + Fore.RED}Failed tasks ({len(ctx._failed)}):{Style.RESET_ALL}")
+        for task, error in ctx._failed:
+            print(f"  {Style.BRIGHT}{ctx._name(task)}{Style.NORMAL}: {type(error).__name__}: {error}")
+        # Root list only groups tasks which are already reported.
+        skipped = [(t, c) for t, c in ctx._skipped if t is not root or not isinstance(root, TaskList)]
+        if len(skipped) > 0:
+            title = f"Not completed because of failed dependencies ({len(skipped)}):"
+            print(f"{Style.BRIGHT + Fore.YELLOW}{title}{Style.RESET_ALL}")
+            for task, cause in skipped:
+                print(f"  {Style.BRIGHT}{ctx._name(task)}{Style.NORMAL} (by {ctx._name(cause)})")
+
+    @staticmethod
+    def _print_decisions(ctx: Context, completed: Collection[Task]) -> None:
+        from colorama import Style
+
+        # Task lists don't do any work by themselves.
+        tasks = [t for t in ctx._flights if t not in completed and not isinstance(t, TaskList)]
+        print(f"{Style.BRIGHT}Task decisions ({len(tasks)}):{Style.RESET_ALL}")
+        for task in tasks:
+            decision = ctx._decisions.get(task, "no up-to-date check, always runs")
+            print(f"  {Style.BRIGHT}{ctx._name(task)}{Style.NORMAL}: {decision}")
+
+    @staticmethod
+    def _store_timings(ctx: Context, root: Task, history: History) -> None:
+        from vortex.tasks.timing import print_timings
+
+        previous = history.last(ctx._key(root))
+        flight = ctx._flights.get(root)
+        # Durations of failed runs are not representative.
+        if flight is not None and flight.done() and flight.exception() is None and root in ctx._timings:
+            history.append(ctx, root)
+        if ctx.timings:
+            print_timings(ctx, root, previous)
+
+    @staticmethod
+    def _store_profile(ctx: Context, root: Task) -> None:
+        from colorama import Style
+
+        assert ctx._profiler is not None
+        path = ctx._profiler.save(ctx.state_path / "profile", ctx._name(root))
+        total, waits = ctx._profiler.split()
+        children = sum([t.usage.cpu for t in ctx._timings.values()])
+        print(f"{Style.BRIGHT}Vortex profile{Style.RESET_ALL} (stored in {path}):")
+        print(ctx._profiler.top(), end="")
+        print(f"  Vortex threads: {total - waits:.2f} s of own work, {waits:.2f} s waiting for processes and other threads")
+        print(f"  Child processes: {children:.2f} s of CPU")
+
+    def run(self, ctx: Context, no_deps: bool = False, completed: Collection[Task] = ()) -> None:
+        "Runs the task. Tasks from `completed` are considered to be up to date and are not executed."
+        from vortex.tasks.timing import History
+        from vortex.tasks.prefetch import Prefetch
+
         ctx.target_path.mkdir(exist_ok=True)
 
         ctx._running = True
         ctx._stack = []
-        ctx._visited = set()
+        ctx._flights = {}
+        for done in completed:
+            flight: Future[None] = Future()
+            flight.set_result(None)
+            ctx._flights[done] = flight
         ctx._guard = Runner._with_info
         ctx._no_deps = no_deps
+        ctx._reports = {}
+        ctx._failed = []
+        ctx._skipped = []
+        ctx._decisions = {}
+        ctx._timings = {}
+        ctx._paths = {}
+        # Components reached from several named tasks get path from the first one, so each of them is walked once.
+        seen: Set[int] = set()
+        for name, named in sorted([(n, t) for t, n in ctx._names.items()]) + [(ctx._name(self.task), self.task)]:
+            for path, comp in walk_components(named, seen):
+                ctx._paths[id(comp)] = f"{name}{path}"
+        history = History(ctx.state_path / History.FILE_NAME)
+        ctx._estimates = history.durations()
+        ctx._peaks = history.peaks()
+        # Branches could be long-running (e.g. services run together), so they are limited only if explicitly requested.
+        ctx._gate = PriorityGate(ctx.jobs or sys.maxsize)
+        ctx._memory = PriorityGate(ctx.memory_limit) if ctx.memory_limit is not None else None
+        if ctx.profile_vortex:
+            from vortex.utils.pyprofile import PyProfiler  # Profiling modules are not needed otherwise.
+
+            ctx._profiler = PyProfiler()
+        else:
+            ctx._profiler = None
 
-        (self.task)(ctx)
+        prefetch = Prefetch.start(ctx, self.task) if ctx.prefetch and not no_deps else None
+        try:
+            with ctx._profiled(), ctx._gate.slot():
+                (self.task)(ctx)
+        except:
+            # Downloads are not needed anymore.
+            ctx._running = False
+            raise
+        finally:
+            if prefetch is not None:
+                # Failed run doesn't wait for downloads it may not even need.
+                prefetch.join(None if ctx._running else Prefetch.CANCEL_TIMEOUT)
+            for report in ctx._reports.values():
+                report(ctx)
+            # History loaded at start is reused, because parsing it takes a noticeable part of short runs.
+            Runner._store_timings(ctx, self.task, history)
+            if ctx._profiler is not None:
+                # Report must not replace error of the task.
+                try:
+                    Runner._store_profile(ctx, self.task)
+                except Exception as e:
+                    logger.warning(f"Cannot store Vortex profile: {type(e).__name__}: {e}")
+            if ctx.explain:
+                Runner._print_decisions(ctx, completed)
+            if ctx.keep_going:
+                Runner._print_failures(ctx, self.task)
+
+
+def walk_components(root: Any, seen: Optional[Set[int]] = None) -> Iterator[Tuple[str, Component]]:
+    "Components referenced from object (owners of tasks, their compilers, sources, etc.) with attribute paths, nearest first."
+    if seen is None:
+        seen = set()
+    queue = deque([("", root)])
+    while len(queue) > 0:
+        path, obj = queue.popleft()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, BoundedTask):
+            queue.append((path, obj.owner))
+        elif isinstance(obj, Component):
+            yield (path, obj)
+            attrs = getattr(obj, "__dict__", {}).items()
+            queue.extend([(f"{path}/{k}", v) for k, v in attrs if not k.startswith(UnboundedTask.BOUNDED_PREFIX)])
+        elif isinstance(obj, Task):
+            # Task lists and other composite tasks.
+            queue.extend([(path, v) for v in getattr(obj, "__dict__", {}).values()])
+        elif isinstance(obj, (list, tuple)):
+            queue.extend([(f"{path}/{i}", v) for i, v in enumerate(obj)])
+        elif isinstance(obj, dict):
+            queue.extend([(f"{path}/{k}", v) for k, v in obj.items()])
 
 
 T = TypeVar("T", bound=Component, contravariant=True)
@@ -131,6 +610,8 @@ class FunctionTask(Task):
 class UnboundedTask:
     method: Callable[[T, Context], None]
 
+    BOUNDED_PREFIX: ClassVar[str] = "__task_"
+
     def __post_init__(self) -> None:
         self.__name__ = self.method.__name__
         self.__qualname__ = self.method.__qualname__
@@ -145,7 +626,7 @@ class UnboundedTask:
 
     def __get__(self, obj: Component | None, type: type | None = None) -> Task | UnboundedTask:
         if obj is not None:
-            name = f"__task_{hash(self.method):x}_bounded"
+            name = f"{self.BOUNDED_PREFIX}{hash(self.method):x}_bounded"
             try:
                 bounded: BoundedTask = getattr(obj, name)
             except AttributeError:
@@ -188,6 +669,15 @@ class BoundedTask(Task):
     def run(self, ctx: Context, *args: Any, **kws: Any) -> None:
         self.inner.run(self.owner, ctx, *args, **kws)
 
+    def watch_paths(self, ctx: Context) -> List[Path]:
+        return self.owner.watch_paths(ctx)
+
+    def memory(self, ctx: Context) -> Optional[int]:
+        return self.owner.memory(ctx)
+
+    def lock_key(self, ctx: Context) -> Optional[str]:
+        return self.owner.lock_key(ctx, self.__name__)
+
     def __repr__(self) -> str:
         return self.method.__repr__()
 
@@ -236,8 +726,16 @@ class TaskList(Task):
     def run(self, ctx: Context, *args: Any, **kws: Any) -> None:
         assert len(args) == 0
         assert len(kws) == 0
+        error: Optional[Exception] = None
         for task in self.tasks:
-            task(ctx)
+            try:
+                task(ctx)
+            except Exception as e:
+                if not ctx.keep_going:
+                    raise
+                error = error or e
+        if error is not None:
+            raise error
 
 
 class DictComponent(Component):
@@ -249,10 +747,17 @@ class DictComponent(Component):
 
 
 class ComponentGroup(Component):
+    _task_map: Dict[str, Task]
+
     def components(self) -> Dict[str, Component]:
         return {k: v for k, v in self.__dict__.items() if isinstance(v, Component)}
 
     def tasks(self) -> Dict[str, Task]:
+        "Task map is built on first call and cached, so components must not be added after that."
+        try:
+            return self._task_map
+        except AttributeError:
+            pass
         tasks: Dict[str, Task] = {}
         for comp_name, comp in self.components().items():
             for task_name, task in comp.tasks().items():
@@ -260,6 +765,7 @@ class ComponentGroup(Component):
                 assert key not in tasks
                 tasks[key] = task
         tasks.update(super().tasks())
+        self._task_map = tasks
         return tasks
 
 
@@ -0,0 +1,236 @@
+from __future__ import annotations
+from typing import Dict, List, Optional
+
+import re
+import json
+from time import time
+from pathlib import Path
+from dataclasses import dataclass, asdict
+from statistics import mean, stdev
+
+from vortex.utils.path import TargetPath
+from vortex.utils.run import run_timed
+from vortex.tasks.base import task, Component, Context
+from vortex.tasks.binary import Executable
+from vortex.tasks.rust import Cargo
+from vortex.tasks.process import run
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Two-sided 95% quantiles of Student's t-distribution for 1..30 degrees of freedom.
+_T95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228]
+_T95 += [2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086]
+_T95 += [2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+_TIME_UNITS = {"ps": 1e-12, "ns": 1e-9, "us": 1e-6, "µs": 1e-6, "μs": 1e-6, "ms": 1e-3, "s": 1.0}
+
+# Criterion summary, e.g. `fib 20   time:   [26.029 µs 26.251 µs 26.505 µs]`. Long names are printed on separate line.
+_CRITERION = re.compile(r"^(.*?)\s*time:\s+\[([\d.]+) (\S+) ([\d.]+) (\S+) ([\d.]+) (\S+)\]")
+# Built-in `#[bench]` result, e.g. `test bench_add ... bench:       1,234 ns/iter (+/- 56)`.
+_LIBTEST = re.compile(r"^test (\S+)\s+\.\.\. bench:\s+([\d,.]+) ns/iter \(\+/- ([\d,.]+)\)")
+
+
+@dataclass
+class Estimate:
+    "Mean of measured value with its 95% confidence interval. Lower values are better."
+
+    mean: float
+    low: float
+    high: float
+    unit: str = "s"
+
+    @staticmethod
+    def of(samples: List[float], unit: str = "s") -> Estimate:
+        if len(samples) < 2:
+            return Estimate(samples[0], samples[0], samples[0], unit)
+        df = len(samples) - 1
+        half = (_T95[df - 1] if df <= len(_T95) else 1.96) * stdev(samples) / len(samples) ** 0.5
+        avg = mean(samples)
+        return Estimate(avg, avg - half, avg + half, unit)
+
+    def format(self, value: float) -> str:
+        if self.unit == "B":
+            return f"{value / 0x100000:.2f} MiB"
+        if self.unit == "s":
+            for name, scale in [("s", 1.0), ("ms", 1e-3), ("us", 1e-6)]:
+                if abs(value) >= scale:
+                    return f"{value / scale:.3f} {name}"
+            return f"{value / 1e-9:.3f} ns"
+        return f"{value:.3f} {self.unit}"
+
+    def __str__(self) -> str:
+        return f"{self.format(self.mean)} ± {self.format((self.high - self.low) / 2)}"
+
+
+Results = Dict[str, Estimate]
+
+
+class Benchmark(Component):
+    "Measures target and fails when it gets slower than stored baseline by more than `threshold` (relative)."
+
+    HISTORY_FILE = "history.jsonl"
+    BASELINE_FILE = "baseline.json"
+    MAX_RUNS = 100
+
+    def __init__(self, path: TargetPath, threshold: float = 0.05) -> None:
+        super().__init__()
+        self.path = path
+        self.threshold = threshold
+
+    def _measure(self, ctx: Context) -> Results:
+        raise NotImplementedError()
+
+    def _load(self, path: Path) -> Optional[Results]:
+        try:
+            with open(path, "r") as f:
+                return {k: Estimate(**v) for k, v in json.load(f).items()}
+        except FileNotFoundError:
+            return None
+
+    def _store_baseline(self, ctx: Context, results: Results) -> None:
+        with open(ctx.target_path / self.path / self.BASELINE_FILE, "w") as f:
+            json.dump({k: asdict(v) for k, v in results.items()}, f, indent=2, sort_keys=True)
+
+    def _store(self, ctx: Context, results: Results) -> None:
+        path = ctx.target_path / self.path
+        path.mkdir(parents=True, exist_ok=True)
+        history = path / self.HISTORY_FILE
+        lines = history.read_text().splitlines() if history.exists() else []
+        lines.append(json.dumps({"time": time(), "results": {k: asdict(v) for k, v in results.items()}}))
+        history.write_text("".join([f"{line}\n" for line in lines[-self.MAX_RUNS :]]))
+
+    def _regressed(self, new: Estimate, old: Estimate) -> bool:
+        "Significant (confidence intervals don't overlap) and large enough slowdown."
+        return new.low > old.high and new.mean > old.mean * (1.0 + self.threshold)
+
+    @task
+    def run(self, ctx: Context) -> None:
+        results = self._measure(ctx)
+        self._store(ctx, results)
+        path = ctx.target_path / self.path / self.BASELINE_FILE
+        recorded = False
+        try:
+            baseline = self._load(path) or {}
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            # Truncated or hand-edited baseline is no better than a missing one, so current results replace it.
+            logger.warning(f"Baseline {path} is unreadable, it is recorded again: {e!r}")
+            self._store_baseline(ctx, results)
+            baseline, recorded = {}, True
+
+        regressions = []
+        for key, est in results.items():
+            old = baseline.get(key)
+            if old is None:
+                print(f"  {key}: {est}")
+                continue
+            change = (est.mean / old.mean - 1.0) * 100.0 if old.mean != 0.0 else float("nan")
+            regressed = self._regressed(est, old)
+            print(f"  {key}: {est} (baseline {old}, {change:+.1f}%){' REGRESSION' if regressed else ''}")
+            if regressed:
+                regressions.append(key)
+        if len(baseline) == 0 and not recorded:
+            print(f"  No baseline, store it with {ctx._name(self.baseline)} task")
+        if len(regressions) > 0:
+            raise RuntimeError(f"Benchmarks regressed by more than {self.threshold * 100:.0f}%: {', '.join(regressions)}")
+
+    @task
+    def baseline(self, ctx: Context) -> None:
+        "Measures target and stores results as baseline for further runs."
+        results = self._measure(ctx)
+        self._store(ctx, results)
+        self._store_baseline(ctx, results)
+        for key, est in results.items():
+            print(f"  {key}: {est}")
+
+
+class ExecutableBenchmark(Benchmark):
+    "Runs executable `runs` times after `warmup` runs and measures its wall time, CPU time and peak memory."
+
+    def __init__(
+        self,
+        executable: Executable,
+        path: TargetPath,
+        args: List[str] = [],
+        runs: int = 10,
+        warmup: int = 1,
+        threshold: float = 0.05,
+    ) -> None:
+        super().__init__(path, threshold=threshold)
+        if runs < 1:
+            raise ValueError(f"Benchmark needs at least one run, got {runs}")
+        self.executable = executable
+        self.args = args
+        self.runs = runs
+        self.warmup = warmup
+
+    def _measure(self, ctx: Context) -> Results:
+        self.executable.build(ctx)
+
+        samples: Dict[str, List[float]] = {"wall": [], "cpu": [], "max_rss": []}
+        for i in range(self.warmup + self.runs):
+            wall, usage = run_timed([ctx.target_path / self.executable.exec_path, *self.args])
+            if i < self.warmup:
+                continue
+            samples["wall"].append(wall)
+            samples["cpu"].append(usage.cpu)
+            samples["max_rss"].append(float(usage.max_rss))
+        return {k: Estimate.of(v, "B" if k == "max_rss" else "s") for k, v in samples.items()}
+
+
+def parse_bench_output(output: str) -> Results:
+    "Time per iteration of each benchmark from `cargo bench` output of criterion or built-in harness."
+    results: Results = {}
+    name: Optional[str] = None
+    for line in output.splitlines():
+        match = _CRITERION.match(line)
+        if match is not None:
+            key = match[1].strip() or name
+            if key is not None:
+                low, avg, high = [float(match[i]) * _TIME_UNITS[match[i + 1]] for i in (2, 4, 6)]
+                results[key] = Estimate(avg, low, high)
+            name = None
+            continue
+        match = _LIBTEST.match(line)
+        if match is not None:
+            avg, dev = [float(match[i].replace(",", "")) * 1e-9 for i in (2, 3)]
+            results[match[1]] = Estimate(avg, avg - dev, avg + dev)
+            continue
+        if line and not line[0].isspace() and not line.startswith(("Benchmarking ", "Found ", "Running ", "test ")):
+            name = line.strip()
+    return results
+
+
+class CargoBenchmark(Benchmark):
+    "Runs `cargo bench` and takes estimates of criterion (or built-in bench harness) as results."
+
+    def __init__(self, cargo: Cargo, path: TargetPath, args: List[str] = [], threshold: float = 0.05) -> None:
+        super().__init__(path, threshold=threshold)
+        self.cargo = cargo
+        self.args = args
+
+    def _measure(self, ctx: Context) -> Results:
+        self.cargo.rustc.install(ctx)
+
+        cargo = self.cargo
+        # Target directory is shared with host builds and tests of other components.
+        with cargo._lock(ctx, cargo.host_target_dir):
+            output = run(
+                ctx,
+                [
+                    "cargo",
+                    "bench",
+                    *([f"--features={','.join(cargo.features)}"] if len(cargo.features) > 0 else []),
+                    *(["--no-default-features"] if not cargo.default_features else []),
+                    *(["--", *self.args] if len(self.args) > 0 else []),
+                ],
+                cwd=cargo.src_path(ctx),
+                env=cargo.host_env(ctx),
+                capture=True,
+            )
+        assert output is not None
+        results = parse_bench_output(output)
+        if len(results) == 0:
+            raise RuntimeError("No benchmark results found in `cargo bench` output")
+        return results
@@ -3,7 +3,8 @@ from __future__ import annotations
 from dataclasses import dataclass
 
 from vortex.utils.path import TargetPath
-from vortex.utils.run import run
+from vortex.utils.run import RunMode
+from vortex.tasks.process import run
 
 from .base import Context, Component, task
 
@@ -30,6 +31,7 @@ class DynamicLib(Component):
 class Executable(Component):
     exec_dir: TargetPath
     exec_name: str
+    run_mode: RunMode = RunMode.NORMAL
 
     @property
     def exec_path(self) -> TargetPath:
@@ -42,4 +44,4 @@ class Executable(Component):
     @task
     def run(self, ctx: Context) -> None:
         self.build(ctx)
-        run([ctx.target_path / self.exec_path], quiet=ctx.capture)
+        run(ctx, [ctx.target_path / self.exec_path], quiet=ctx.capture, mode=self.run_mode, interactive=True)
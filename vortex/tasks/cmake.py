@@ -21,13 +21,27 @@ class Cmake(Component):
         (ctx.target_path / self.build_dir).mkdir(exist_ok=True)
 
     def env(self, ctx: Context) -> Dict[str, str]:
-        return {}
+        launcher = self.cc.cache_launcher(ctx)
+        if launcher is None:
+            return {}
+        return {
+            **self.cc.cache_env(ctx),
+            "CMAKE_C_COMPILER_LAUNCHER": str(launcher),
+            "CMAKE_CXX_COMPILER_LAUNCHER": str(launcher),
+        }
 
     def opt(self, ctx: Context) -> List[str]:
         return []
 
+    def watch_paths(self, ctx: Context) -> List[Path]:
+        return [prepend_if_target(ctx.target_path, self.src_dir)]
+
+    def lock_key(self, ctx: Context, task: str) -> Optional[str]:
+        return str(self.build_dir) if task in ["configure", "build"] else None
+
     @task
     def configure(self, ctx: Context) -> None:
+        ctx.decide("delegated to cmake")
         self.create_build_dir(ctx)
         run(
             [
@@ -44,6 +58,7 @@ class Cmake(Component):
     def build(self, ctx: Context, verbose: bool = False) -> None:
         self.cc.install(ctx)
         self.configure(ctx)
+        ctx.decide("delegated to cmake")
 
         run(
             [
@@ -56,5 +71,6 @@ class Cmake(Component):
                 *(["--verbose"] if verbose else []),
             ],
             cwd=(ctx.target_path / self.build_dir),
+            env=self.env(ctx),
             quiet=ctx.capture,
         )
@@ -1,14 +1,16 @@
 from __future__ import annotations
-from typing import List, overload
+from typing import Any, Callable, ClassVar, Dict, List, Optional, overload
 
 import shutil
+import threading
 from pathlib import Path, PurePosixPath
 from dataclasses import dataclass
 
 from vortex.utils.path import TargetPath
-from vortex.utils.run import capture
-from vortex.utils.net import download_alt
-from vortex.tasks.base import task, Component, Context
+from vortex.utils.run import run, capture, RunError
+from vortex.tasks.base import task, Component, Context, Task
+from vortex.tasks.utils import pull_outputs, push_outputs
+from vortex.utils.remote_cache import fingerprint
 
 import logging
 
@@ -48,10 +50,97 @@ class Target:
         )
 
 
+class CompilerCache:
+    "Compiler cache launcher (ccache, sccache, etc.) with cache directory inside target directory."
+
+    tool: str = ""
+    dir_env: str = ""
+
+    def __init__(self, path: Optional[TargetPath] = None) -> None:
+        self.path = TargetPath("cache") / self.tool if path is None else path
+        self._lock = threading.Lock()
+        self._looked_up = False
+        self._which: Optional[str] = None
+
+    def env(self, ctx: Context) -> Dict[str, str]:
+        return {self.dir_env: str(ctx.target_path / self.path)}
+
+    def _lookup(self) -> Optional[str]:
+        "Tool is looked up once, because launcher is requested by each build (and each test of sharded run)."
+        with self._lock:
+            if not self._looked_up:
+                self._looked_up = True
+                self._which = shutil.which(self.tool)
+                if self._which is None:
+                    logger.warning(f"Compiler cache '{self.tool}' is not installed, building without cache")
+            return self._which
+
+    def launcher(self, ctx: Context) -> Optional[Path]:
+        "Path to launcher executable or `None` if it is not installed."
+        path = self._lookup()
+        if path is None:
+            return None
+        key = f"{self.tool}:{ctx.target_path / self.path}"
+        with ctx._lock:
+            first = key not in ctx._reports
+            ctx._reports.setdefault(key, self.report)
+        if first:
+            run([path, "--zero-stats"], env=self.env(ctx), quiet=True)
+        return Path(path)
+
+    def report(self, ctx: Context) -> None:
+        print(f"Compiler cache statistics ({self.tool}):")
+        # Report is printed after failed run too, so its own failure must not replace error of the task.
+        try:
+            run([self.tool, "--show-stats"], env=self.env(ctx))
+        except (RunError, OSError) as e:
+            logger.warning(f"Cannot get statistics of '{self.tool}': {e}")
+
+
+class Ccache(CompilerCache):
+    tool = "ccache"
+    dir_env = "CCACHE_DIR"
+
+
+class Sccache(CompilerCache):
+    "Supports both C/C++ and Rust compilers."
+
+    tool = "sccache"
+    dir_env = "SCCACHE_DIR"
+
+
+class DetectedTarget(Target):
+    "Target which is detected by calling `detect` on first access to avoid probing toolchains at import time."
+
+    FIELDS: ClassVar[List[str]] = ["isa", "vendor", "api", "abi"]
+
+    def __init__(self, detect: Callable[[], str]) -> None:
+        # Fields are initialized lazily in `__getattr__`.
+        self._detect = detect
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str) -> Any:
+        # Other missing attributes (e.g. probed by `copy` or `hasattr`) must not run detection.
+        if name not in self.FIELDS:
+            raise AttributeError(name)
+        # Tasks of parallel branches may access target at the same time.
+        with self._lock:
+            if "isa" not in self.__dict__:
+                super().__init__(*self._detect().split("-"))
+        return self.__dict__[name]
+
+
 @dataclass
 class Compiler(Component):
     name: str
     target: Target
+    cache: Optional[CompilerCache] = None
+
+    def cache_launcher(self, ctx: Context) -> Optional[Path]:
+        return self.cache.launcher(ctx) if self.cache is not None else None
+
+    def cache_env(self, ctx: Context) -> Dict[str, str]:
+        return self.cache.env(ctx) if self.cache is not None else {}
 
     @task
     def install(self, ctx: Context) -> None:
@@ -73,8 +162,8 @@ class Gcc(Compiler):
 
 
 class GccHost(Gcc):
-    def __init__(self) -> None:
-        super().__init__("host", Target.from_str(capture(["gcc", "-dumpmachine"])))
+    def __init__(self, cache: Optional[CompilerCache] = None) -> None:
+        super().__init__("host", DetectedTarget(lambda: capture(["gcc", "-dumpmachine"])), cache=cache)
 
     @property
     def path(self) -> Path:
@@ -88,8 +177,16 @@ HOST_GCC = GccHost()
 
 
 class GccCross(Gcc):
-    def __init__(self, name: str, target: Target, dir_name: str, archive: str, urls: List[str]):
-        super().__init__(name, target)
+    def __init__(
+        self,
+        name: str,
+        target: Target,
+        dir_name: str,
+        archive: str,
+        urls: List[str],
+        cache: Optional[CompilerCache] = None,
+    ):
+        super().__init__(name, target, cache=cache)
 
         self.dir_name = dir_name
         self.archive = archive
@@ -104,20 +201,36 @@ class GccCross(Gcc):
     def bin(self, name: str) -> TargetPath:
         return self.path / "bin" / f"{self.target}-{name}"
 
+    def lock_key(self, ctx: Context, task: str) -> Optional[str]:
+        return str(self.path) if task == "install" else None
+
+    def prefetch_tasks(self, ctx: Context) -> List[Task]:
+        return [self.install]
+
     @task
     def install(self, ctx: Context) -> None:
         self_path = ctx.target_path / self.path
         if self_path.exists():
+            ctx.decide("up to date")
             logger.info(f"Toolchain {self.archive} is already installed")
             return
+        # Toolchain is relocatable, so it is shared regardless of target directory.
+        key = fingerprint(type(self).__qualname__, self.archive, self.dir_name)
+        if pull_outputs(ctx, key, {"toolchain": self_path}):
+            ctx.decide(f"missing '{self_path}', pulled from remote cache")
+            return
+        ctx.decide(f"missing '{self_path}'")
 
-        tmp_dir = ctx.target_path / "download"
-        tmp_dir.mkdir(exist_ok=True)
+        # Toolchains may be installed concurrently, so each of them is downloaded to its own directory.
+        tmp_dir = ctx.target_path / "download" / self.dir_name
+        tmp_dir.mkdir(parents=True, exist_ok=True)
 
         archive_path = tmp_dir / self.archive
         if not archive_path.exists():
+            from vortex.utils.net import download_alt  # Networking modules are slow to import.
+
             logger.info(f"Loading toolchain {self.archive} ...")
-            download_alt(self.urls, archive_path)
+            download_alt(self.urls, archive_path, quiet=ctx.capture)
         else:
             logger.info(f"Toolchain archive {self.archive} already downloaded")
 
@@ -132,6 +245,7 @@ class GccCross(Gcc):
 
         shutil.move(dir_path, self_path)
         shutil.rmtree(tmp_dir)
+        push_outputs(ctx, key, {"toolchain": self_path})
 
     @task
     def deploy(self, ctx: Context) -> None:
@@ -1,16 +1,23 @@
 from __future__ import annotations
 from typing import Any, Optional
 
+from time import perf_counter
 from threading import Thread
-from multiprocessing import Queue
+from queue import Queue
 
+from vortex.utils.run import RunCancelled
 from vortex.tasks.base import Context, Task, TaskList
 
 
 class TaskThread(Thread):
     def thread_func(self) -> None:
+        # Worker continues the call stack of the thread which started it.
+        self.ctx._stack = self.stack
         try:
-            self.task(self.ctx)
+            with self.ctx._profiled(), self.ctx._gate.slot(self.priority):
+                if not self.ctx._running:
+                    raise RunCancelled(f"{self.task.name()} is cancelled before start")
+                self.task(self.ctx)
         except BaseException as e:
             self.queue.put(e)
         else:
@@ -19,8 +26,10 @@ class TaskThread(Thread):
     def __init__(self, ctx: Context, task: Task, queue: Queue[Optional[BaseException]]) -> None:
         super().__init__(target=self.thread_func)
         self.ctx = ctx
+        self.stack = list(ctx._stack)
         self.task = task
         self.queue = queue
+        self.priority = ctx._estimate(task)
 
 
 class ConcurrentTaskList(TaskList):
@@ -28,25 +37,42 @@ class ConcurrentTaskList(TaskList):
         assert len(args) == 0
         assert len(kws) == 0
         queue: Queue[Optional[BaseException]] = Queue()
-        threads = [TaskThread(ctx, t, queue) for t in self.tasks]
+        threads = []
+        for task in self.tasks:
+            flight = ctx._flights.get(task)
+            if flight is None or ctx._no_deps or task in ctx._stack:
+                threads.append(TaskThread(ctx, task, queue))
+            else:
+                # Task is already executed by another thread, so its result is awaited without starting one more.
+                ctx._add_caller(task)
+                flight.add_done_callback(lambda f: queue.put(f.exception()))
+        # Branches with the longest expected duration go first, because they bound total time.
+        # It matters only if number of jobs is limited, otherwise all branches run at once.
+        threads.sort(key=lambda th: -th.priority)
+        start = perf_counter()
         for th in threads:
             th.start()
 
         e: Optional[BaseException] = None
         count = 0
-        try:
-            while count < len(threads):
-                e = queue.get()
-                if e is not None:
-                    ctx._running = False
-                    break
-                else:
+        with ctx._gate.released():
+            try:
+                while count < len(self.tasks):
+                    r = queue.get()
                     count += 1
-        except KeyboardInterrupt as ke:
-            ctx._running = False
-            e = ke
+                    if r is not None:
+                        e = e or r
+                        # In keep-going mode only interrupts stop independent branches.
+                        if not ctx.keep_going or not isinstance(r, Exception):
+                            ctx._running = False
+                            break
+            except KeyboardInterrupt as ke:
+                ctx._running = False
+                e = ke
 
-        for th in threads:
-            th.join()
+            for th in threads:
+                th.join()
+        # Branches are executed by other workers.
+        ctx._waited(perf_counter() - start)
         if e is not None:
             raise e
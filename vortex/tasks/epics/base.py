@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import List
+from typing import Dict, List, Optional
 
 import shutil
 from pathlib import Path, PurePosixPath
@@ -8,7 +8,8 @@ from vortex.utils.path import TargetPath, prepend_if_target
 from vortex.utils.run import capture, run
 from vortex.tasks.base import task, Component, Context
 from vortex.tasks.compiler import Target, Gcc
-from vortex.tasks.utils import TreeModInfo
+from vortex.tasks.utils import TreeModInfo, pull_outputs, push_outputs
+from vortex.utils.remote_cache import fingerprint, tree_digest
 
 import logging
 
@@ -24,6 +25,8 @@ def epics_arch_by_target(target: Target) -> str:
 
 
 class EpicsProject(Component):
+    KEY_FILE = ".cache_key"
+
     def __init__(
         self,
         src_dir: Path | TargetPath,
@@ -49,10 +52,70 @@ class EpicsProject(Component):
     def _configure(self, ctx: Context) -> None:
         raise NotImplementedError()
 
+    def _cache_config_paths(self, ctx: Context) -> List[Path]:
+        "Config files to add compiler cache launcher to. They must be included after toolchain definitions."
+        return [ctx.target_path / self.build_dir / "configure/CONFIG_SITE"]
+
+    def _configure_cache(self, ctx: Context) -> None:
+        # Configs are installed and may be pulled from remote cache by other machines, so they don't contain launcher path.
+        # It is passed to `make` at build time instead, and without it the compiler is used as is.
+        # Original compiler definitions are captured unexpanded to keep them lazy.
+        text = "\n".join(
+            [
+                "",
+                "# Compiler cache launcher (added by vortex)",
+                "ifdef VORTEX_CC_LAUNCHER",
+                "ifndef VORTEX_CC",
+                "$(eval VORTEX_CC = $(value CC))",
+                "$(eval VORTEX_CCC = $(value CCC))",
+                "CC = $(VORTEX_CC_LAUNCHER) $(VORTEX_CC)",
+                "CCC = $(VORTEX_CC_LAUNCHER) $(VORTEX_CCC)",
+                "endif",
+                "endif",
+                "",
+            ]
+        )
+        for path in self._cache_config_paths(ctx):
+            with open(path, "a") as f:
+                f.write(text)
+
     def _dep_paths(self, ctx: Context) -> List[Path]:
         "Dependent paths."
         return [prepend_if_target(ctx.target_path, self.src_dir)]
 
+    def _cache_inputs(self, ctx: Context) -> List[Path]:
+        "Paths which content identifies outputs in remote cache."
+        return self._dep_paths(ctx)
+
+    def _cache_outputs(self, ctx: Context) -> Dict[str, Path]:
+        "Outputs to store in remote cache."
+        return {"install": ctx.target_path / self.install_dir}
+
+    def _cache_key(self, ctx: Context) -> str:
+        # Built files contain absolute paths, so they are shared only between machines with the same target directory.
+        return fingerprint(
+            type(self).__qualname__,
+            str(ctx.target_path),
+            self.cc.name,
+            str(self.cc.target),
+            *[tree_digest(p) for p in self._cache_inputs(ctx)],
+        )
+
+    def built_cache_key(self, ctx: Context) -> str:
+        "Cache key of built outputs. It is stored on build, so that dependent projects don't hash the inputs again."
+        try:
+            return (ctx.target_path / self.build_dir / self.KEY_FILE).read_text()
+        except FileNotFoundError:
+            return self._cache_key(ctx)
+
+    def lock_key(self, ctx: Context, task: str) -> Optional[str]:
+        # Deploying and running IOC only read build outputs, and the latter may last indefinitely.
+        return str(self.build_dir) if task == "build" else None
+
+    def watch_paths(self, ctx: Context) -> List[Path]:
+        # Other dependent paths are produced by tasks, so their changes are tracked through dependencies.
+        return [prepend_if_target(ctx.target_path, self.src_dir)]
+
     @task
     def build(self, ctx: Context, clean: bool = False) -> None:
         self.cc.install(ctx)
@@ -60,14 +123,31 @@ class EpicsProject(Component):
         build_path = ctx.target_path / self.build_dir
 
         info = TreeModInfo.load(build_path)
-        if info is None or not info.newer_than(*self._dep_paths(ctx)):
+        changed = info.changed_input(*self._dep_paths(ctx)) if info is not None else None
+        if info is None:
+            reason = f"missing state in '{build_path}'"
+            clean = True
+        elif changed is not None:
+            reason = f"changed input '{changed}'"
             clean = True
         else:
+            ctx.decide("up to date")
             logger.info(f"'{build_path}' is already built")
             return
+        ctx.decide(reason)
 
         if clean:
             shutil.rmtree(build_path, ignore_errors=True)
+        else:
+            (build_path / self.KEY_FILE).unlink(missing_ok=True)
+
+        key = self._cache_key(ctx) if ctx.cache_url is not None else None
+        if key is not None and pull_outputs(ctx, key, self._cache_outputs(ctx)):
+            ctx.decide(f"{reason}, pulled from remote cache")
+            build_path.mkdir(parents=True, exist_ok=True)
+            (build_path / self.KEY_FILE).write_text(key)
+            TreeModInfo(build_path).store()
+            return
 
         self._prepare_source(ctx)
 
@@ -83,15 +163,27 @@ class EpicsProject(Component):
 
         logger.info(f"Configure {build_path}")
         self._configure(ctx)
+        self._configure_cache(ctx)
 
         logger.info(f"Build {build_path}")
+        launcher = self.cc.cache_launcher(ctx)
         run(
-            ["make", "--jobs", *([str(ctx.jobs)] if ctx.jobs is not None else [])],
+            [
+                "make",
+                "--jobs",
+                *([str(ctx.jobs)] if ctx.jobs is not None else []),
+                *([f"VORTEX_CC_LAUNCHER={launcher}"] if launcher is not None else []),
+            ],
             cwd=build_path,
+            env=self.cc.cache_env(ctx),
             quiet=ctx.capture,
         )
 
+        if key is not None:
+            (build_path / self.KEY_FILE).write_text(key)
         TreeModInfo(build_path).store()
+        if key is not None:
+            push_outputs(ctx, key, self._cache_outputs(ctx))
 
     def _pre_deploy(self, ctx: Context) -> None:
         pass
@@ -79,6 +79,14 @@ class AbstractEpicsBase(EpicsProject):
             ctx.target_path / self.build_dir / "configure/CONFIG_SITE",
         )
 
+    def _cache_config_paths(self, ctx: Context) -> List[Path]:
+        # Base `CONFIG_SITE` is included before toolchain definitions, so the per-arch site configs are used instead.
+        host_arch = epics_host_arch(prepend_if_target(ctx.target_path, self.source.src_dir))
+        return [
+            ctx.target_path / self.build_dir / f"configure/os/CONFIG_SITE.Common.{arch}"
+            for arch in sorted({host_arch, self.arch})
+        ]
+
     def _configure(self, ctx: Context) -> None:
         self._configure_common(ctx)
         self._configure_toolchain(ctx)
@@ -1,12 +1,14 @@
 from __future__ import annotations
-from typing import List, Sequence, Any
+from typing import Dict, List, Sequence, Any
 
 import shutil
 import re
 from pathlib import Path, PurePosixPath
 
 from vortex.utils.path import TargetPath
+from vortex.utils.run import RunMode
 from vortex.utils.files import substitute
+from vortex.utils.remote_cache import fingerprint
 from vortex.tasks.base import task, Context
 from vortex.tasks.binary import DynamicLib
 from vortex.tasks.epics.base import EpicsProject
@@ -15,9 +17,16 @@ from vortex.tasks.process import run
 
 
 class AbstractIoc(EpicsProject):
-    def __init__(self, ioc_dir: Path, target_dir: TargetPath, epics_base: AbstractEpicsBase):
+    def __init__(
+        self,
+        ioc_dir: Path,
+        target_dir: TargetPath,
+        epics_base: AbstractEpicsBase,
+        run_mode: RunMode = RunMode.NORMAL,
+    ):
         super().__init__(ioc_dir, target_dir, epics_base.cc, deploy_path=PurePosixPath("/opt/ioc"))
         self.epics_base = epics_base
+        self.run_mode = run_mode
 
     @property
     def name(self) -> str:
@@ -40,6 +49,14 @@ class AbstractIoc(EpicsProject):
         )
         install_path.mkdir(exist_ok=True)
 
+    def _cache_key(self, ctx: Context) -> str:
+        # Base is identified by its own key, because hashing its whole install tree takes longer than building IOC.
+        return fingerprint(super()._cache_key(ctx), self.epics_base.built_cache_key(ctx))
+
+    def _cache_outputs(self, ctx: Context) -> Dict[str, Path]:
+        # Boot scripts are installed from build directory after build.
+        return {**super()._cache_outputs(ctx), "iocBoot": ctx.target_path / self.build_dir / "iocBoot"}
+
     def _post_install(self, ctx: Context) -> None:
         shutil.rmtree(
             ctx.target_path / self.install_dir / "iocBoot",
@@ -95,7 +112,7 @@ class IocHost(AbstractIoc):
             "LD_LIBRARY_PATH": ":".join([str(p) for p in lib_dirs]),
         }
 
-        run(ctx, args, cwd=cwd, env=env)
+        run(ctx, args, cwd=cwd, env=env, mode=self.run_mode, interactive=True)
 
 
 class IocCross(AbstractIoc):
@@ -130,8 +147,9 @@ class AbstractIocWithLibs(AbstractIoc):
         target_dir: TargetPath,
         epics_base: AbstractEpicsBase,
         dylibs: Sequence[DynamicLib] = [],
+        run_mode: RunMode = RunMode.NORMAL,
     ) -> None:
-        super().__init__(ioc_dir, target_dir, epics_base)
+        super().__init__(ioc_dir, target_dir, epics_base, run_mode)
         self.dylibs = dylibs
 
     def _dep_paths(self, ctx: Context) -> List[Path]:
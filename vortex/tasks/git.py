@@ -7,7 +7,7 @@ from dataclasses import dataclass
 
 from vortex.utils.path import TargetPath
 from vortex.utils.run import run, RunError
-from vortex.tasks.base import task, Component, Context
+from vortex.tasks.base import task, Component, Context, Task
 
 import logging
 
@@ -53,12 +53,20 @@ class RepoList(Component):
     path: TargetPath
     sources: List[RepoSource]
 
+    def lock_key(self, ctx: Context, task: str) -> Optional[str]:
+        return str(self.path) if task == "clone" else None
+
+    def prefetch_tasks(self, ctx: Context) -> List[Task]:
+        return [self.clone]
+
     @task
     def clone(self, ctx: Context) -> None:
+        path = ctx.target_path / self.path
+        ctx.decide("up to date" if path.exists() else f"missing '{path}'")
         last_error = None
         for source in self.sources:
             try:
-                clone(ctx.target_path / self.path, source.remote, source.branch, clean=True, quiet=ctx.capture)
+                clone(path, source.remote, source.branch, clean=True, quiet=ctx.capture)
                 return
             except RunError as e:
                 last_error = e
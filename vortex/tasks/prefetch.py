@@ -0,0 +1,69 @@
+from __future__ import annotations
+from typing import Dict, List, Optional
+
+from time import monotonic
+from threading import Thread
+
+from vortex.tasks.base import Context, Task, walk_components
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetch:
+    "Runs network-bound tasks required by root task in background, so they overlap with CPU-bound ones."
+
+    CANCEL_TIMEOUT = 1.0
+    "Time given to cancelled tasks to stop, in seconds. Threads which are still blocked by network are left behind."
+
+    def __init__(self, ctx: Context, tasks: List[Task]) -> None:
+        self.ctx = ctx
+        self.tasks = tasks
+        self.threads = [Thread(target=self._run, args=(t,), daemon=True) for t in tasks]
+        self.errors: Dict[Task, BaseException] = {}
+
+    @staticmethod
+    def start(ctx: Context, root: Task) -> Optional[Prefetch]:
+        tasks: List[Task] = []
+        for _, comp in walk_components(root):
+            for task in comp.prefetch_tasks(ctx):
+                if task is not root and task not in ctx._flights and task not in tasks:
+                    tasks.append(task)
+        if len(tasks) == 0:
+            return None
+        logger.info(f"Prefetching: {', '.join([ctx._name(t) for t in tasks])}")
+        prefetch = Prefetch(ctx, tasks)
+        for th in prefetch.threads:
+            th.start()
+        return prefetch
+
+    def _run(self, task: Task) -> None:
+        # Thread doesn't hold job slot, because it mostly waits for network. Consumers wait for the task flight.
+        self.ctx._local.background = True
+        try:
+            with self.ctx._profiled():
+                if self.ctx._running:
+                    task(self.ctx)
+        except BaseException as e:
+            self.errors[task] = e
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        "Waits for started tasks. Failures of tasks which no other task has needed are not errors of the run."
+        deadline = monotonic() + timeout if timeout is not None else None
+        for th in self.threads:
+            th.join(max(deadline - monotonic(), 0.0) if deadline is not None else None)
+        ctx = self.ctx
+        left = [t for t, th in zip(self.tasks, self.threads) if th.is_alive()]
+        if len(left) > 0:
+            logger.debug(f"Prefetch is left unfinished: {', '.join([ctx._name(t) for t in left])}")
+        with ctx._lock:
+            # Prefetched task may fail because of another one (e.g. compiler because of its toolchain), that isn't a need.
+            needed = {cause for t, cause in ctx._skipped if t not in self.errors}
+            for task, error in self.errors.items():
+                if task in needed:
+                    continue
+                ctx._failed = [(t, e) for t, e in ctx._failed if t is not task]
+                ctx._skipped = [(t, c) for t, c in ctx._skipped if t is not task]
+                if ctx._running:
+                    logger.warning(f"Prefetch of {ctx._name(task)} failed: {type(error).__name__}: {error}")
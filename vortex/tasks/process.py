@@ -1,7 +1,12 @@
 from __future__ import annotations
-from typing import Any, Optional
+from typing import Any, Callable, List, Optional, Sequence
 
-from vortex.utils.run import run as basic_run
+import re
+from time import strftime
+from pathlib import Path
+
+from vortex.utils.path import PathLike
+from vortex.utils.run import run as basic_run, RunMode, RunError
 from vortex.tasks.base import Context
 
 import logging
@@ -9,6 +14,76 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-def run(ctx: Context, *args: Any, **kws: Any) -> Optional[str]:
+def _profile_dir(ctx: Context, kind: str) -> Path:
+    "Unique directory for profile of current task."
+    name = ctx._name(ctx._stack[-1]) if len(ctx._stack) > 0 else "run"
+    base = ctx.target_path / kind / re.sub(r"[^\w.-]+", "_", name) / strftime("%Y%m%d-%H%M%S")
+    path, i = base, 1
+    while path.exists():
+        path, i = base.with_name(f"{base.name}-{i}"), i + 1
+    path.mkdir(parents=True)
+    return path
+
+
+def _print_profile(dir: Path) -> None:
+    from colorama import Style
+    from vortex.utils import perf
+
+    if not (dir / perf.DATA_FILE).exists():
+        return
+    try:
+        top = perf.summarize(dir)
+    except (OSError, RunError) as e:
+        logger.warning(f"Cannot summarize profile {dir}: {e}")
+        return
+    print(f"{Style.BRIGHT}Profile{Style.RESET_ALL} stored in {dir}:")
+    for name in perf.artifacts(dir):
+        print(f"  {name}")
+    if top is not None:
+        print(f"{Style.BRIGHT}Top symbols (self samples):{Style.RESET_ALL}")
+        for line in top:
+            print(f"  {line}")
+
+
+def _print_heap(dir: Path) -> None:
+    from colorama import Style
+    from vortex.utils import heap
+
+    try:
+        summary = heap.summarize(dir)
+    except (OSError, RunError, ValueError) as e:
+        logger.warning(f"Cannot summarize heap profile {dir}: {e}")
+        return
+    if summary is None:
+        return
+    print(f"{Style.BRIGHT}Heap profile{Style.RESET_ALL} stored in {dir}:")
+    for line in summary:
+        print(f"  {line}")
+
+
+def run(ctx: Context, args: Sequence[str | PathLike], *rest: Any, mode: RunMode = RunMode.NORMAL, **kws: Any) -> Optional[str]:
+    "Runs process which is stopped when the run is cancelled. Profiler output is stored per task in target directory."
     assert "alive" not in kws
-    return basic_run(*args, alive=lambda: ctx._running, **kws)
+    prefix: List[str]
+    report: Callable[[], None]
+    if mode == RunMode.PROFILER:
+        from vortex.utils import perf
+
+        dir = _profile_dir(ctx, "perf")
+        prefix = perf.record_args(dir / perf.DATA_FILE, ctx.perf_frequency, ctx.perf_call_graph)
+        report = lambda: _print_profile(dir)
+    elif mode == RunMode.MEMORY:
+        from vortex.utils import heap
+
+        dir = _profile_dir(ctx, "heap")
+        prefix = heap.record_args(dir)
+        report = lambda: _print_heap(dir)
+    else:
+        return basic_run(args, *rest, alive=lambda: ctx._running, mode=mode, **kws)
+
+    try:
+        return basic_run([*prefix, *args], *rest, alive=lambda: ctx._running, **kws)
+    finally:
+        # Profile of failed process (e.g. failed tests) is still useful.
+        if ctx._running:
+            report()
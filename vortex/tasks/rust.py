@@ -1,61 +1,151 @@
 from __future__ import annotations
-from typing import Dict, List, Optional
+from typing import ClassVar, ContextManager, Dict, List, Optional, Set, Tuple
 
+import os
 import re
-from pathlib import Path
+import json
+import heapq
+from time import perf_counter
+from pathlib import Path, PurePath
 from dataclasses import dataclass, field
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
 
 from vortex.utils.path import TargetPath
-from vortex.utils.run import run, capture, RunMode
-from vortex.tasks.base import task, Component, Context
-from vortex.tasks.compiler import Compiler, Gcc, Target, HOST_GCC
+from vortex.utils.lock import FileLock
+from vortex.utils.run import run, capture, inherit_scopes, RunMode, RunError
+from vortex.tasks.base import task, Component, Context, Task
+from vortex.tasks.compiler import Compiler, CompilerCache, DetectedTarget, Gcc, Target, HOST_GCC
 from vortex.tasks.process import run as run_with_ctx
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Test passed in output of libtest, e.g. `test tests::add ... ok`.
+_LIBTEST_OK = re.compile(r"^test (.+) \.\.\. ok$", re.MULTILINE)
 
-class Rustc(Compiler):
-    def __init__(self, postfix: str, target: Target, cc: Gcc, toolchain: Optional[str] = None):
-        super().__init__(f"rustc_{postfix}", target)
+
+class Rustup(Component):
+    "Installs toolchains and targets required by `Rustc` instances under a lock shared by all users of rustup home."
+
+    STATE_FILE = "rustup.json"
+
+    def __init__(self) -> None:
         self.path = TargetPath("rustup")
+
+    def home(self, ctx: Context) -> str:
+        if ctx.local:
+            return str(ctx.target_path / self.path)
+        else:
+            return os.environ.get("RUSTUP_HOME", str(Path.home() / ".rustup"))
+
+    def env(self, ctx: Context) -> Dict[str, str]:
+        return {"RUSTUP_HOME": str(ctx.target_path / self.path)} if ctx.local else {}
+
+    def _load_state(self, ctx: Context) -> Dict[str, Dict[str, List[str]]]:
+        try:
+            with open(ctx.state_path / self.STATE_FILE, "r") as f:
+                state: Dict[str, Dict[str, List[str]]] = json.load(f)
+            return state
+        except (FileNotFoundError, ValueError) as e:
+            logger.debug(f"Cannot load rustup state: {e}")
+            return {}
+
+    @staticmethod
+    def _on_disk(home: Path, toolchain: str, target: str) -> bool:
+        "Cheap check that target recorded in state was not removed outside of Vortex (or state was restored elsewhere)."
+        toolchains = home / "toolchains"
+        rustlib = PurePath("lib", "rustlib", target)
+        return (toolchains / toolchain / rustlib).exists() or any(toolchains.glob(f"{toolchain}-*/{rustlib}"))
+
+    def _store_state(self, ctx: Context, state: Dict[str, Dict[str, List[str]]]) -> None:
+        ctx.state_path.mkdir(parents=True, exist_ok=True)
+        with open(ctx.state_path / self.STATE_FILE, "w") as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+
+    def install(self, ctx: Context, toolchain: str, target: str) -> None:
+        "Installs target of toolchain. Called from task of each `Rustc`, so only targets needed by the run are installed."
+        home = Path(self.home(ctx))
+        # Rustup home may be shared by projects with different target directories.
+        with FileLock(home / "vortex.lock"):
+            state = self._load_state(ctx)
+            installed = state.setdefault(str(home), {})
+            if not ctx.update and target in installed.get(toolchain, []) and self._on_disk(home, toolchain, target):
+                ctx.decide("up to date")
+                logger.info(f"Rustup target {toolchain}: {target} is already installed")
+                return
+            ctx.decide("forced by --update" if ctx.update else f"missing target {toolchain}: {target}")
+
+            cmds = [
+                ["rustup", "set", "profile", "minimal"],
+                ["rustup", "target", "add", "--toolchain", toolchain, target],
+                *([] if not ctx.update else [["rustup", "update", "--force-non-host", f"{toolchain}-{target}"]]),
+            ]
+            for cmd in cmds:
+                run(cmd, env=self.env(ctx), quiet=ctx.capture)
+
+            installed[toolchain] = sorted({target, *installed.get(toolchain, [])})
+            self._store_state(ctx, state)
+
+
+RUSTUP = Rustup()
+
+
+class Rustc(Compiler):
+    def __init__(
+        self,
+        postfix: str,
+        target: Target,
+        cc: Gcc,
+        toolchain: Optional[str] = None,
+        cache: Optional[CompilerCache] = None,
+    ):
+        super().__init__(f"rustc_{postfix}", target, cache=cache)
+        self.rustup = RUSTUP
+        self.path = self.rustup.path
         self.cc = cc
         self.toolchain = "stable" if toolchain is None else toolchain
 
     def env(self, ctx: Context) -> Dict[str, str]:
         return {
-            **({"RUSTUP_HOME": str(ctx.target_path / self.path)} if ctx.local else {}),
+            **self.rustup.env(ctx),
             "RUSTUP_TOOLCHAIN": self.toolchain,
         }
 
+    def prefetch_tasks(self, ctx: Context) -> List[Task]:
+        return [self.install]
+
     @task
     def install(self, ctx: Context) -> None:
         self.cc.install(ctx)
-
-        cmds = [
-            ["rustup", "set", "profile", "minimal"],
-            ["rustup", "target", "add", str(self.target)],
-            *([] if not ctx.update else [["rustup", "update", "--force-non-host", f"{self.toolchain}-{self.target}"]]),
-        ]
-        for cmd in cmds:
-            run(cmd, env=self.env(ctx), quiet=ctx.capture)
+        self.rustup.install(ctx, self.toolchain, str(self.target))
 
 
 class RustcHost(Rustc):
     _target_pattern: re.Pattern[str] = re.compile(r"^Default host:\s+(\S+)$", re.MULTILINE)
 
-    def __init__(self, toolchain: Optional[str] = None):
+    def __init__(self, toolchain: Optional[str] = None, cache: Optional[CompilerCache] = None):
+        super().__init__("host", DetectedTarget(self._detect_target), HOST_GCC, toolchain=toolchain, cache=cache)
+
+    @classmethod
+    def _detect_target(cls) -> str:
         info = capture(["rustup", "show"])
-        match = re.search(self._target_pattern, info)
+        match = re.search(cls._target_pattern, info)
         assert match is not None, f"Cannot detect rustup host rustc:\n{info}"
-        target = Target.from_str(match[1])
-        super().__init__("host", target, HOST_GCC, toolchain=toolchain)
+        return match[1]
 
 
 class RustcCross(Rustc):
-    def __init__(self, postfix: str, target: Target, cc: Gcc, toolchain: Optional[str] = None):
-        super().__init__(postfix, target, cc, toolchain=toolchain)
+    def __init__(
+        self,
+        postfix: str,
+        target: Target,
+        cc: Gcc,
+        toolchain: Optional[str] = None,
+        cache: Optional[CompilerCache] = None,
+    ):
+        super().__init__(postfix, target, cc, toolchain=toolchain, cache=cache)
 
     def env(self, ctx: Context) -> Dict[str, str]:
         target_uu = str(self.target).upper().replace("-", "_")
@@ -66,6 +156,68 @@ class RustcCross(Rustc):
         }
 
 
+HOST_TARGET = DetectedTarget(RustcHost._detect_target)
+"Target of host. Commands run without `--target` (tests, `cargo run`) build for it."
+
+
+@dataclass
+class CargoTest:
+    "Single test case from Cargo test binary."
+
+    binary: Path
+    cwd: Path
+    key: str
+    name: str
+
+
+@dataclass
+class CargoTestResult:
+    test: CargoTest
+    duration: float
+    passed: bool
+    output: str = ""
+    "Output of failed test."
+
+
+class CargoTestTimings:
+    "Test durations from previous runs stored in target directory next to test binaries."
+
+    FILE_NAME = "test_timings.json"
+
+    def __init__(self, path: Path) -> None:
+        self.path = path / self.FILE_NAME
+        self.durations = self._load()
+
+    def _load(self) -> Dict[str, float]:
+        try:
+            with open(self.path, "r") as f:
+                return {str(k): float(v) for k, v in json.load(f).items()}
+        except (FileNotFoundError, ValueError, AttributeError) as e:
+            logger.debug(f"Cannot load test timings: {e}")
+            return {}
+
+    def estimate(self, key: str) -> float:
+        "Unknown tests are considered to be the slowest ones."
+        return self.durations.get(key, max(self.durations.values(), default=1.0))
+
+    def store(self, results: List[CargoTestResult]) -> None:
+        "Durations stored since loading (e.g. by components sharing target directory) are kept."
+        self.durations = {**self._load(), **{r.test.key: r.duration for r in results}}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(self.durations, f, indent=2, sort_keys=True)
+
+    def shards(self, tests: List[CargoTest], count: int) -> List[List[CargoTest]]:
+        "Splits `tests` into at most `count` shards of about equal duration, slowest shards and tests first."
+        heap: List[Tuple[float, int, List[CargoTest]]] = [(0.0, i, []) for i in range(count)]
+        # Each test is added to the shortest shard, so the slowest ones are spread first and the rest fill the gaps.
+        for test in sorted(tests, key=lambda t: self.estimate(t.key), reverse=True):
+            total, i, shard = heapq.heappop(heap)
+            shard.append(test)
+            heapq.heappush(heap, (total + self.estimate(test.key), i, shard))
+        return [shard for _, _, shard in sorted(heap, reverse=True, key=lambda s: s[0]) if len(shard) > 0]
+
+
 @dataclass
 class Cargo(Component):
     src_dir: Path | TargetPath
@@ -75,6 +227,10 @@ class Cargo(Component):
     default_features: bool = True
     release: bool = False
     run_mode: RunMode = RunMode.NORMAL
+    shared_target: bool = False
+    "Share target directory with other components. Their packages must not have binaries or libraries with the same name."
+
+    ARTIFACTS_FILE: ClassVar[str] = "vortex-artifacts.json"
 
     def __post_init__(self) -> None:
         self.home_dir = Path.cwd() / ".cargo"
@@ -83,15 +239,75 @@ class Cargo(Component):
         return {"RUST_LOG": ctx.log_level.level_name()}
 
     def env(self, ctx: Context) -> Dict[str, str]:
+        wrapper = self.rustc.cache_launcher(ctx)
         return {
             **self.rustc.env(ctx),
+            **({**self.rustc.cache_env(ctx), "RUSTC_WRAPPER": str(wrapper)} if wrapper is not None else {}),
             **({"CARGO_HOME": str(self.home_dir)} if ctx.local else {}),
-            "CARGO_TARGET_DIR": str(ctx.target_path / self.build_dir),
+            "CARGO_TARGET_DIR": str(ctx.target_path / self.target_dir),
         }
 
+    def host_env(self, ctx: Context) -> Dict[str, str]:
+        "Environment of commands building for host rather than for the rustc target."
+        return {**self.env(ctx), "CARGO_TARGET_DIR": str(ctx.target_path / self.host_target_dir)}
+
+    @property
+    def profile(self) -> str:
+        return "release" if self.release else "debug"
+
+    def _shared_dir(self, target: Target) -> TargetPath:
+        return TargetPath("cargo") / self.rustc.toolchain / str(target) / self.profile
+
+    @property
+    def target_dir(self) -> TargetPath:
+        "Cargo target directory. Shared target directory is common for all components with the same toolchain, target and profile."
+        return self._shared_dir(self.rustc.target) if self.shared_target else self.build_dir
+
+    @property
+    def host_target_dir(self) -> TargetPath:
+        "Target directory of commands building for host, so that host artifacts don't get into directory of other target."
+        return self._shared_dir(HOST_TARGET) if self.shared_target else self.build_dir
+
+    def _lock(self, ctx: Context, target_dir: Optional[TargetPath] = None) -> ContextManager[object]:
+        "Lock target directory if it is shared with other components."
+        if self.shared_target:
+            return FileLock(ctx.target_path / (target_dir or self.target_dir).parent / f"{self.profile}.lock")
+        else:
+            return nullcontext()
+
+    def _claim_artifacts(self, ctx: Context) -> None:
+        "Checks that no other package sharing target directory builds binary or library with the same name."
+        output = capture(["cargo", "metadata", "--no-deps", "--format-version=1"], cwd=self.src_path(ctx), env=self.env(ctx))
+        names: Set[str] = set()
+        for package in json.loads(output)["packages"]:
+            for target in package["targets"]:
+                if "bin" in target["kind"]:
+                    names.add(f"bin:{target['name']}")
+                elif len(set(target["kind"]) & {"lib", "rlib", "dylib", "cdylib", "staticlib"}) > 0:
+                    names.add(f"lib:{target['name'].replace('-', '_')}")
+
+        path = ctx.target_path / self.target_dir / self.ARTIFACTS_FILE
+        owners: Dict[str, str] = {}
+        try:
+            with open(path, "r") as f:
+                owners = json.load(f)
+        except (FileNotFoundError, ValueError) as e:
+            logger.debug(f"Cannot load owners of artifacts: {e}")
+        src = str(self.src_path(ctx).resolve())
+        clashes = sorted([n for n in names if owners.get(n, src) != src])
+        if len(clashes) > 0:
+            raise RuntimeError(
+                f"Artifacts of '{src}' would overwrite ones with the same names in shared target directory: "
+                + ", ".join([f"{n} (of '{owners[n]}')" for n in clashes])
+            )
+        owners.update({n: src for n in names})
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(owners, f, indent=2, sort_keys=True)
+
     @property
     def bin_dir(self) -> TargetPath:
-        return self.build_dir / str(self.rustc.target) / ("release" if self.release else "debug")
+        return self.target_dir / str(self.rustc.target) / self.profile
 
     def src_path(self, ctx: Context) -> Path:
         if isinstance(self.src_dir, Path):
@@ -99,9 +315,13 @@ class Cargo(Component):
         else:
             return ctx.target_path / self.src_dir
 
+    def watch_paths(self, ctx: Context) -> List[Path]:
+        return [self.src_path(ctx)]
+
     @task
     def build(self, ctx: Context) -> None:
         self.rustc.install(ctx)
+        ctx.decide("forced by --update" if ctx.update else "delegated to cargo")
 
         cmds = [
             *([["cargo", "update"]] if ctx.update else []),
@@ -114,32 +334,164 @@ class Cargo(Component):
                 *(["--release"] if self.release else []),
             ],
         ]
-        for cmd in cmds:
-            run(cmd, cwd=self.src_path(ctx), env=self.env(ctx), quiet=ctx.capture)
+        with self._lock(ctx):
+            if self.shared_target:
+                self._claim_artifacts(ctx)
+            for cmd in cmds:
+                run(cmd, cwd=self.src_path(ctx), env=self.env(ctx), quiet=ctx.capture)
 
     @task
     def test(self, ctx: Context) -> None:
         self.rustc.install(ctx)
 
-        run(
-            [
-                "cargo",
-                "test",
-                *([f"--features={','.join(self.features)}"] if len(self.features) > 0 else []),
-                *(["--no-default-features"] if not self.default_features else []),
-                # "--",
-                # "--nocapture",
-            ],
-            cwd=self.src_path(ctx),
-            env=self.env(ctx),
-            quiet=ctx.capture,
-            mode=self.run_mode,
+        if self.run_mode == RunMode.MEMORY:
+            # Heap profilers don't follow child processes, so test binaries are run under profiler instead of cargo.
+            for binary, cwd, _ in self._build_tests(ctx):
+                run_with_ctx(ctx, [binary], cwd=cwd, env=self.host_env(ctx), quiet=ctx.capture, mode=self.run_mode)
+            return
+
+        with self._lock(ctx, self.host_target_dir):
+            run_with_ctx(
+                ctx,
+                [
+                    "cargo",
+                    "test",
+                    *([f"--features={','.join(self.features)}"] if len(self.features) > 0 else []),
+                    *(["--no-default-features"] if not self.default_features else []),
+                    # "--",
+                    # "--nocapture",
+                ],
+                cwd=self.src_path(ctx),
+                env=self.host_env(ctx),
+                quiet=ctx.capture,
+                mode=self.run_mode,
+            )
+
+    def _build_executables(self, ctx: Context, args: List[str], test: bool) -> List[Tuple[Path, Path, str]]:
+        "Builds host executables by Cargo command `args`. Returns binary paths, working directories and names."
+        with self._lock(ctx, self.host_target_dir):
+            output = run(
+                [
+                    "cargo",
+                    *args,
+                    "--message-format=json",
+                    *([f"--features={','.join(self.features)}"] if len(self.features) > 0 else []),
+                    *(["--no-default-features"] if not self.default_features else []),
+                ],
+                cwd=self.src_path(ctx),
+                env=self.host_env(ctx),
+                capture=True,
+                quiet=ctx.capture,
+            )
+        assert output is not None
+        binaries = []
+        for line in output.splitlines():
+            if not line.startswith("{"):
+                continue
+            msg = json.loads(line)
+            if msg.get("reason") != "compiler-artifact" or msg.get("executable") is None:
+                continue
+            if msg["profile"]["test"] != test:
+                continue
+            cwd = Path(msg["manifest_path"]).parent if "manifest_path" in msg else self.src_path(ctx)
+            binaries.append((Path(msg["executable"]), cwd, f"{msg['target']['kind'][0]}:{msg['target']['name']}"))
+        return binaries
+
+    def _build_tests(self, ctx: Context) -> List[Tuple[Path, Path, str]]:
+        "Build test binaries without running them."
+        return self._build_executables(ctx, ["test", "--no-run"], test=True)
+
+    def _list_tests(self, ctx: Context, binary: Path, cwd: Path, prefix: str) -> List[CargoTest]:
+        output = run([binary, "--list", "--format", "terse"], cwd=cwd, env=self.host_env(ctx), capture=True)
+        assert output is not None
+        tests = []
+        for line in output.splitlines():
+            name, sep, kind = line.rpartition(": ")
+            if sep and kind == "test":
+                tests.append(CargoTest(binary, cwd, f"{prefix}::{name}", name))
+        return tests
+
+    def _run_shard(self, ctx: Context, shard: List[CargoTest], timings: CargoTestTimings) -> List[CargoTestResult]:
+        "Runs tests of each binary in shard by one process. Its time is split by estimates, so that shard totals are exact."
+        groups: Dict[Tuple[Path, Path], List[CargoTest]] = {}
+        for test in shard:
+            groups.setdefault((test.binary, test.cwd), []).append(test)
+
+        results = []
+        for (binary, cwd), tests in groups.items():
+            start = perf_counter()
+            try:
+                run_with_ctx(
+                    ctx,
+                    [binary, "--exact", "--test-threads=1", *[t.name for t in tests]],
+                    cwd=cwd,
+                    env={**self.host_env(ctx), **self.log_env(ctx)},
+                    quiet=True,
+                    keep_output=True,
+                )
+                output, passed = "", {t.name for t in tests}
+            except RunError as e:
+                # Tests not reported as passed are failed, including ones not run because the process crashed.
+                output = e.output or ""
+                passed = set(_LIBTEST_OK.findall(output))
+            duration = perf_counter() - start
+            estimates = [timings.estimate(t.key) for t in tests]
+            for test, estimate in zip(tests, estimates):
+                ok = test.name in passed
+                results.append(CargoTestResult(test, duration * estimate / sum(estimates), ok, "" if ok else output))
+        return results
+
+    @task
+    def test_sharded(self, ctx: Context) -> None:
+        "Run tests in shards balanced by durations of previous runs, one shard per each of `ctx.jobs` workers."
+        self.rustc.install(ctx)
+
+        tests = [t for b in self._build_tests(ctx) for t in self._list_tests(ctx, *b)]
+        timings = CargoTestTimings(ctx.target_path / self.host_target_dir)
+        shards = timings.shards(tests, ctx.jobs or os.cpu_count() or 1)
+
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, len(shards))) as pool:
+            # Workers run shards in scopes of the task, so that their usage is attributed to it.
+            results = [r for rs in pool.map(inherit_scopes(lambda s: self._run_shard(ctx, s, timings)), shards) for r in rs]
+        wall = perf_counter() - start
+        with self._lock(ctx, self.host_target_dir):
+            timings.store(results)
+
+        failed = [r for r in results if not r.passed]
+        # Output of shards run in parallel is printed only now, so that output of each one is not interleaved with others.
+        outputs: Dict[str, List[str]] = {}
+        for r in failed:
+            outputs.setdefault(r.output, []).append(r.test.key)
+        for output, keys in outputs.items():
+            print(f"---- {', '.join(keys)} output ----")
+            print(output, end="" if output.endswith("\n") else "\n")
+        print(f"Test durations (slowest first, estimated within {len(shards)} shards):")
+        for r in sorted(results, key=lambda r: r.duration, reverse=True):
+            print(f"  {r.duration:8.3f} s  {'ok    ' if r.passed else 'FAILED'}  {r.test.key}")
+        print(
+            f"{len(results) - len(failed)} passed, {len(failed)} failed; "
+            + f"{wall:.3f} s wall, {sum(r.duration for r in results):.3f} s total"
         )
+        if len(failed) > 0:
+            raise RuntimeError(f"Failed tests: {', '.join(r.test.key for r in failed)}")
 
     @task
     def run(self, ctx: Context, bin: Optional[str] = None) -> None:
         self.rustc.install(ctx)
 
+        if self.run_mode == RunMode.MEMORY:
+            # Program is run under heap profiler directly, because profilers don't follow children of cargo.
+            binaries = self._build_executables(ctx, ["build", *(["--bin", bin] if bin is not None else [])], test=False)
+            binaries = [b for b in binaries if b[2].startswith("bin:")]
+            if len(binaries) != 1:
+                names = ", ".join([name for _, _, name in binaries])
+                raise RuntimeError(f"Cannot determine which binary to run, specify one of: {names}")
+            run_with_ctx(
+                ctx, [binaries[0][0]], cwd=self.src_path(ctx), env=self.host_env(ctx), mode=self.run_mode, interactive=True
+            )
+            return
+
         run_with_ctx(
             ctx,
             [
@@ -150,6 +502,7 @@ class Cargo(Component):
                 *(["--no-default-features"] if not self.default_features else []),
             ],
             cwd=self.src_path(ctx),
-            env=self.env(ctx),
+            env=self.host_env(ctx),
             mode=self.run_mode,
+            interactive=True,
         )
@@ -0,0 +1,51 @@
+from __future__ import annotations
+from typing import List
+
+from pathlib import Path, PurePosixPath
+
+from vortex.utils.snapshot import ChunkStore, store_tree, restore_tree
+from vortex.tasks.base import task, Component, Context
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TargetSnapshot(Component):
+    "Incremental deduplicated snapshots of the whole target directory, e.g. to keep it between CI runs."
+
+    def __init__(self, store: Path, name: str = "target", exclude: List[str] = [".vortex/locks"]) -> None:
+        super().__init__()
+        self.store = store
+        self.name = name
+        self.exclude = exclude
+
+    def _exclude(self, ctx: Context) -> List[PurePosixPath]:
+        exclude = [PurePosixPath(p) for p in self.exclude]
+        store = self.store.resolve()
+        if store.is_relative_to(ctx.target_path.resolve()):
+            exclude.append(PurePosixPath(store.relative_to(ctx.target_path.resolve()).as_posix()))
+        return exclude
+
+    @task
+    def snapshot(self, ctx: Context) -> None:
+        store = ChunkStore(self.store)
+        stats = store_tree(ctx.target_path, store, self.name, self._exclude(ctx))
+        removed = store.prune()
+        print(
+            f"Snapshot '{self.name}': {stats['files']} files, {stats['reused']} unchanged, "
+            + f"{stats['chunks']} chunks ({stats['bytes'] / 0x100000:.1f} MiB) read, {removed} unused chunks removed"
+        )
+
+    @task
+    def restore(self, ctx: Context) -> None:
+        store = ChunkStore(self.store)
+        if not store.manifest(self.name).exists():
+            ctx.decide(f"no snapshot '{self.name}' in '{self.store}'")
+            logger.warning(f"There is no snapshot '{self.name}' in '{self.store}' to restore")
+            return
+        stats = restore_tree(ctx.target_path, store, self.name, self._exclude(ctx))
+        print(
+            f"Restored snapshot '{self.name}': {stats['files']} files, {stats['kept']} already up to date, "
+            + f"{stats['removed']} paths not in snapshot removed"
+        )
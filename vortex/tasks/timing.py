@@ -0,0 +1,166 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+
+import json
+from time import time
+from pathlib import Path
+
+from vortex.tasks.base import Context, Task, TaskTiming
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+Run = Dict[str, Any]
+
+
+class History:
+    "Durations of tasks from previous successful runs, stored as one JSON line per run."
+
+    FILE_NAME = "history.jsonl"
+    MAX_RUNS = 100
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.runs: List[Run] = []
+        try:
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        self.runs.append(json.loads(line))
+                    except ValueError:
+                        logger.debug(f"Skipping broken history line in '{path}'")
+        except FileNotFoundError:
+            pass
+
+    def last(self, root: str) -> Optional[Run]:
+        "The last run of `root` task."
+        for run in reversed(self.runs):
+            if run["task"] == root:
+                return run
+        return None
+
+    def durations(self) -> Dict[str, float]:
+        "The latest known duration of each task including its dependencies, i.e. length of its critical path."
+        durations: Dict[str, float] = {}
+        for run in self.runs:
+            durations.update({name: t["duration"] for name, t in run["tasks"].items()})
+        return durations
+
+    def peaks(self) -> Dict[str, int]:
+        "The highest known peak memory (max RSS of processes) of each task, in bytes."
+        peaks: Dict[str, int] = {}
+        for run in self.runs:
+            for name, t in run["tasks"].items():
+                if "rss" in t:
+                    peaks[name] = max(peaks.get(name, 0), t["rss"])
+        return peaks
+
+    def append(self, ctx: Context, root: Task) -> None:
+        run: Run = {
+            "time": time(),
+            "task": ctx._key(root),
+            "wall": ctx._timings[root].duration,
+            "tasks": {
+                ctx._key(task): {
+                    "duration": t.duration,
+                    "self": t.self_time,
+                    "worker": t.worker,
+                    "cpu": t.usage.cpu,
+                    "rss": t.usage.max_rss,
+                    "io": t.usage.in_blocks + t.usage.out_blocks,
+                }
+                for task, t in ctx._timings.items()
+            },
+        }
+        self.runs.append(run)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if len(self.runs) > 2 * self.MAX_RUNS:
+                self.runs = self.runs[-self.MAX_RUNS :]
+                with open(self.path, "w") as f:
+                    f.writelines([json.dumps(r) + "\n" for r in self.runs])
+            else:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(run) + "\n")
+        except OSError as e:
+            logger.warning(f"Cannot store run history: {e}")
+
+
+def critical_path(ctx: Context, root: Task) -> List[Task]:
+    "Chain of tasks which bounds total time: each next one is the dependency which finished last."
+    callees: Dict[Task, List[Task]] = {}
+    for task, callers in ctx._callers.items():
+        if task in ctx._timings:
+            for caller in callers:
+                callees.setdefault(caller, []).append(task)
+
+    path = [root]
+    while True:
+        deps = [t for t in callees.get(path[-1], []) if t not in path]
+        if len(deps) == 0:
+            break
+        path.append(max(deps, key=lambda t: ctx._timings[t].end))
+    return path
+
+
+def _seconds(value: float) -> str:
+    return f"{value:.2f} s"
+
+
+def _change(value: float, previous: Optional[float]) -> str:
+    if previous is None:
+        return ""
+    return f" (was {_seconds(previous)}, {value - previous:+.2f} s)"
+
+
+def _usage(timing: TaskTiming) -> str:
+    "Tells whether task processes mostly used CPU or waited for I/O."
+    usage = timing.usage
+    if usage.max_rss == 0:
+        return ""
+    load = usage.cpu / timing.self_time if timing.self_time > 0.0 else 0.0
+    return "".join(
+        [
+            f"\n    processes: cpu {_seconds(usage.cpu)} ({load:.0%} of self time)",
+            f", max rss {usage.max_rss / 0x100000:.0f} MiB",
+            f", block io {usage.in_blocks + usage.out_blocks}",
+            f", context switches {usage.switches} voluntary / {usage.preemptions} involuntary",
+        ]
+    )
+
+
+def print_timings(ctx: Context, root: Task, previous: Optional[Run], top: int = 10) -> None:
+    from colorama import Style
+
+    if root not in ctx._timings:
+        return
+    timings = ctx._timings
+    before: Dict[str, Any] = previous["tasks"] if previous is not None else {}
+
+    def prev(task: Task, key: str) -> Optional[float]:
+        value: Optional[float] = before.get(ctx._key(task), {}).get(key)
+        return value
+
+    wall = timings[root].duration
+    print(f"{Style.BRIGHT}Run time of {ctx._name(root)}:{Style.NORMAL} {_seconds(wall)}{_change(wall, prev(root, 'duration'))}")
+
+    print(f"{Style.BRIGHT}Critical path:{Style.RESET_ALL}")
+    for task in critical_path(ctx, root):
+        t = timings[task]
+        print(
+            f"  {ctx._name(task)}: {_seconds(t.duration)}, self {_seconds(t.self_time)}{_change(t.duration, prev(task, 'duration'))}"
+        )
+
+    busy = sum([t.self_time for t in timings.values()])
+    workers = len({t.worker for t in timings.values()})
+    efficiency = busy / (wall * workers) if wall > 0.0 else 1.0
+    print(
+        f"{Style.BRIGHT}Parallel efficiency:{Style.NORMAL} {efficiency:.0%}"
+        + f" ({_seconds(busy)} busy of {_seconds(wall)} x {workers} workers){Style.RESET_ALL}"
+    )
+
+    print(f"{Style.BRIGHT}Top tasks by self time:{Style.RESET_ALL}")
+    ordered: List[Tuple[Task, TaskTiming]] = sorted(timings.items(), key=lambda x: -x[1].self_time)
+    for task, t in ordered[:top]:
+        print(f"  {ctx._name(task)}: {_seconds(t.self_time)}{_change(t.self_time, prev(task, 'self'))}{_usage(t)}")
@@ -1,5 +1,5 @@
 from __future__ import annotations
-from typing import Optional, ClassVar
+from typing import Dict, Optional, ClassVar, Tuple
 
 import os
 from time import time
@@ -9,6 +9,8 @@ import json
 
 from dataclass_type_validator import dataclass_validate, TypeValidationError  # type: ignore
 
+from vortex.tasks.base import Context
+
 import logging
 
 logger = logging.getLogger(__name__)
@@ -40,24 +42,59 @@ class TreeModInfo:
             json.dump({"path": str(self.path), "time": self.time}, f, indent=2, sort_keys=True)
 
     def newer_than(self, *deps: Path) -> bool:
-        return self.time > max([0.0] + [tree_mod_time(d) for d in deps])
+        return self.changed_input(*deps) is None
+
+    def changed_input(self, *deps: Path) -> Optional[Path]:
+        "The most recently modified file among `deps` if it is modified after the tree."
+        if len(deps) == 0:
+            return None
+        mod_time, path = max([tree_mod_file(d) for d in deps])
+        return path if mod_time >= self.time else None
 
 
-def tree_mod_time(path: Path) -> float:
+def tree_mod_file(path: Path) -> Tuple[float, Path]:
+    "Modification time and path of the most recently modified file in the tree."
     if path.is_dir():
         info = TreeModInfo.load(path)
         if info is not None:
-            return info.time
+            return (info.time, path / TreeModInfo.FILE_NAME)
 
-        max_time = 0.0
+        newest = (0.0, path)
         for dirpath, dirnames, filenames in os.walk(path):
-            max_time = max(
-                [
-                    max_time,
-                    os.path.getmtime(dirpath),
-                    *[os.path.getmtime(os.path.join(dirpath, fn)) for fn in filenames],
-                ]
-            )
-        return max_time
+            for p in [dirpath, *[os.path.join(dirpath, fn) for fn in filenames]]:
+                mod_time = os.path.getmtime(p)
+                if mod_time > newest[0]:
+                    newest = (mod_time, Path(p))
+        return newest
     else:
-        return os.path.getmtime(path)
+        return (os.path.getmtime(path), path)
+
+
+def tree_mod_time(path: Path) -> float:
+    return tree_mod_file(path)[0]
+
+
+def pull_outputs(ctx: Context, key: str, paths: Dict[str, Path]) -> bool:
+    "Replaces `paths` with outputs from remote cache if it is enabled and has `key`."
+    if ctx.cache_url is None:
+        return False
+    from tarfile import TarError
+    from vortex.utils.remote_cache import RemoteCache  # Networking modules are slow to import.
+
+    try:
+        return RemoteCache(ctx.cache_url).pull(key, paths)
+    except (OSError, ValueError, EOFError, TarError) as e:
+        logger.warning(f"Cannot pull {key} from remote cache: {e}")
+        return False
+
+
+def push_outputs(ctx: Context, key: str, paths: Dict[str, Path]) -> None:
+    "Stores `paths` in remote cache if pushing is enabled. Failure doesn't fail the task."
+    if ctx.cache_url is None or not ctx.cache_push:
+        return
+    from vortex.utils.remote_cache import RemoteCache
+
+    try:
+        RemoteCache(ctx.cache_url).push(key, paths)
+    except OSError as e:
+        logger.warning(f"Cannot push {key} to remote cache: {e}")
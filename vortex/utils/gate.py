@@ -0,0 +1,72 @@
+from __future__ import annotations
+from typing import Dict, Generator, List, Tuple
+
+import heapq
+import threading
+from math import inf
+from itertools import count
+from contextlib import contextmanager
+
+
+class PriorityGate:
+    "Limits amount of resource (threads, memory, etc.) used concurrently. Waiting threads are admitted by priority."
+
+    def __init__(self, capacity: int) -> None:
+        assert capacity > 0
+        self.capacity = capacity
+        self._used = 0
+        self._holders: Dict[int, int] = {}
+        self._waiting: List[Tuple[float, int]] = []
+        self._order = count()
+        self._cond = threading.Condition()
+
+    def _admitted(self, entry: Tuple[float, int], amount: int) -> bool:
+        # Amount larger than capacity is admitted alone.
+        fits = self._used + amount <= self.capacity or self._used == 0
+        return fits and self._waiting[0] == entry
+
+    def acquire(self, priority: float = 0.0, amount: int = 1) -> None:
+        assert threading.get_ident() not in self._holders
+        entry = (-priority, next(self._order))
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            try:
+                self._cond.wait_for(lambda: self._admitted(entry, amount))
+            except BaseException:
+                self._waiting.remove(entry)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            self._used += amount
+            self._holders[threading.get_ident()] = amount
+            # Next waiter could also fit.
+            self._cond.notify_all()
+
+    def release(self) -> None:
+        with self._cond:
+            self._used -= self._holders.pop(threading.get_ident())
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: float = 0.0, amount: int = 1) -> Generator[None, None, None]:
+        self.acquire(priority, amount)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextmanager
+    def released(self) -> Generator[None, None, None]:
+        "Gives slot of current thread (if any) to others while it is blocked."
+        with self._cond:
+            amount = self._holders.get(threading.get_ident())
+        if amount is None:
+            yield
+            return
+        self.release()
+        try:
+            yield
+        finally:
+            # Resumed thread has already started its work, so it goes first.
+            self.acquire(inf, amount)
@@ -0,0 +1,107 @@
+from __future__ import annotations
+from typing import List, Optional, Tuple
+
+import re
+import shutil
+from pathlib import Path
+
+from vortex.utils.run import run
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+MASSIF_FILE = "massif.out"
+HEAPTRACK_PREFIX = "heaptrack"
+REPORT_FILE = "heap.txt"
+
+# Lines of `heaptrack_print` summary to show.
+_HEAPTRACK_SUMMARY = [
+    "calls to allocation functions:",
+    "temporary memory allocations:",
+    "peak heap memory consumption:",
+    "peak RSS",
+    "total memory leaked:",
+]
+
+
+def tool() -> str:
+    "Installed heap profiler, `heaptrack` is preferred as it is much faster than `valgrind`."
+    for name in ["heaptrack", "valgrind"]:
+        if shutil.which(name) is not None:
+            return name
+    raise RuntimeError("Neither heaptrack nor valgrind is installed, heap cannot be profiled")
+
+
+def record_args(dir: Optional[Path] = None) -> List[str]:
+    "Prefix for command to run under heap profiler. Results are stored in `dir` if given, otherwise in working directory."
+    if tool() == "heaptrack":
+        return ["heaptrack", *(["-o", str(dir / HEAPTRACK_PREFIX)] if dir is not None else [])]
+    else:
+        return ["valgrind", "--tool=massif", *([f"--massif-out-file={dir / MASSIF_FILE}"] if dir is not None else [])]
+
+
+def _heaptrack_data(dir: Path) -> Optional[Path]:
+    # Extension depends on compression heaptrack was built with.
+    files = [p for p in dir.glob(f"{HEAPTRACK_PREFIX}.*") if p.suffix in (".zst", ".gz")]
+    return files[0] if len(files) > 0 else None
+
+
+def _summarize_heaptrack(data: Path, count: int) -> List[str]:
+    output = run(["heaptrack_print", "-f", data, "--peak-limit", str(count)], capture=True)
+    assert output is not None
+    (data.parent / REPORT_FILE).write_text(output)
+    lines = output.splitlines()
+    summary = [line.strip() for line in lines if any(line.startswith(s) for s in _HEAPTRACK_SUMMARY)]
+    try:
+        section = lines.index("PEAK MEMORY CONSUMERS") + 1
+    except ValueError:
+        return summary
+    sites = []
+    i = section
+    while i < len(lines) - 1:
+        # Entry starts with e.g. `1.20M peak memory consumed over 10 calls from` followed by function.
+        if lines[i].endswith(" calls from"):
+            sites.append(f"{lines[i].split(' peak', 1)[0]:>8} {lines[i + 1].strip()}")
+            i += 1
+        elif lines[i] and not lines[i][0].isspace() and not lines[i][0].isdigit():
+            # Next section.
+            break
+        i += 1
+    return [*summary, "top allocation sites at peak:", *[f"  {s}" for s in sites[:count]]]
+
+
+def _massif_peak(text: str) -> Tuple[int, List[Tuple[int, str]]]:
+    "Peak heap size and allocation sites of detailed peak snapshot from massif output."
+    peak, sites = 0, []
+    for snapshot in re.split(r"^#-+\nsnapshot=\d+\n#-+\n", text, flags=re.M)[1:]:
+        heap = int(re.search(r"^mem_heap_B=(\d+)", snapshot, re.M).group(1))  # type: ignore[union-attr]
+        if "heap_tree=peak" in snapshot:
+            # Direct children of the root of allocation tree, e.g. ` n0: 1024 0x4005E4: main (a.c:5)`.
+            sites = [(int(size), site) for size, site in re.findall(r"^ n\d+: (\d+) (?:0x[0-9A-F]+: )?(.*)$", snapshot, re.M)]
+        peak = max(peak, heap)
+    return (peak, sites)
+
+
+def _summarize_massif(data: Path, count: int) -> List[str]:
+    if shutil.which("ms_print") is not None:
+        output = run(["ms_print", data], capture=True)
+        assert output is not None
+        (data.parent / REPORT_FILE).write_text(output)
+    peak, sites = _massif_peak(data.read_text())
+    return [
+        f"peak heap memory consumption: {peak / 0x100000:.2f} MiB",
+        "top allocation sites at peak:",
+        *[f"  {size / 0x100000:8.2f} MiB {site}" for size, site in sites[:count]],
+    ]
+
+
+def summarize(dir: Path, count: int = 10) -> Optional[List[str]]:
+    "Stores text report of heap profile in `dir`. Returns peak heap, allocation counts and top allocation sites."
+    heaptrack = _heaptrack_data(dir)
+    if heaptrack is not None:
+        return _summarize_heaptrack(heaptrack, count)
+    if (dir / MASSIF_FILE).exists():
+        return _summarize_massif(dir / MASSIF_FILE, count)
+    return None
@@ -0,0 +1,149 @@
+from __future__ import annotations
+from typing import Any, Collection, Dict, Optional, Set
+
+import os
+import errno
+import select
+import struct
+import ctypes
+from time import monotonic
+from pathlib import Path
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+)
+
+_EVENT = struct.Struct("iIII")
+
+_libc: Optional[ctypes.CDLL] = None
+
+
+def _lib() -> ctypes.CDLL:
+    global _libc
+    if _libc is None:
+        _libc = ctypes.CDLL(None, use_errno=True)
+    return _libc
+
+
+def _check(ret: int) -> int:
+    if ret < 0:
+        code = ctypes.get_errno()
+        raise OSError(code, os.strerror(code))
+    return ret
+
+
+class Inotify:
+    "Watches directory trees for changes using Linux inotify. Only directories are watched, so it scales with tree size."
+
+    def __init__(self) -> None:
+        self.fd = _check(_lib().inotify_init1(IN_NONBLOCK | IN_CLOEXEC))
+        self._watches: Dict[int, Path] = {}
+        self._roots: Set[Path] = set()
+        self._exclude: Set[Path] = set()
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+    def __enter__(self) -> Inotify:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def _add(self, path: Path) -> None:
+        try:
+            wd = _check(_lib().inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK))
+        except OSError as e:
+            # Directory could be removed while walking.
+            if e.errno in (errno.ENOENT, errno.ENOTDIR):
+                return
+            raise
+        self._watches[wd] = path
+
+    def watch_tree(self, root: Path, exclude: Collection[Path] = ()) -> None:
+        "Watches `root` and all its subdirectories except VCS ones and `exclude`."
+        self._roots.add(root)
+        self._exclude.update(exclude)
+        self._walk(root)
+
+    def _walk(self, root: Path) -> None:
+        if not root.is_dir():
+            self._add(root)
+            return
+        for dirpath, dirnames, _ in os.walk(root):
+            path = Path(dirpath)
+            self._add(path)
+            dirnames[:] = [d for d in dirnames if d != ".git" and path / d not in self._exclude]
+
+    def read(self, timeout: Optional[float] = None) -> Set[Path]:
+        "Waits for events at most `timeout` seconds and returns changed paths."
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if len(ready) == 0:
+            return set()
+        try:
+            data = os.read(self.fd, 0x10000)
+        except BlockingIOError:
+            return set()
+
+        changed: Set[Path] = set()
+        pos = 0
+        while pos < len(data):
+            wd, mask, _, size = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            name = os.fsdecode(data[pos : pos + size].rstrip(b"\0"))
+            pos += size
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("Inotify event queue overflow, assuming everything changed")
+                changed.update(self._roots)
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            base = self._watches.get(wd)
+            if base is None:
+                continue
+            path = base / name if name else base
+            if name == ".git" or path in self._exclude:
+                continue
+            changed.add(path)
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and path not in self._exclude:
+                # New directories are not watched automatically.
+                self._walk(path)
+        return changed
+
+    def wait_changes(self, debounce: float) -> Set[Path]:
+        "Blocks until something changes and then collects changes until there are none for `debounce` seconds."
+        changed: Set[Path] = set()
+        while len(changed) == 0:
+            changed = self.read()
+        deadline = monotonic() + debounce
+        while True:
+            left = deadline - monotonic()
+            if left <= 0.0:
+                break
+            more = self.read(left)
+            if len(more) > 0:
+                changed.update(more)
+                deadline = monotonic() + debounce
+        return changed
@@ -0,0 +1,60 @@
+from __future__ import annotations
+from typing import Any, Optional
+
+import os
+import fcntl
+from pathlib import Path
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class FileLock:
+    "Exclusive advisory lock on file. Works both between processes and between threads of the same process."
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def acquired(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        "Acquires lock if it is free. Returns `False` otherwise."
+        assert self._fd is None, f"Lock '{self.path}' is already acquired"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def acquire(self) -> None:
+        if self.try_acquire():
+            return
+        logger.info(f"Waiting for lock '{self.path}' ...")
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        except:
+            os.close(fd)
+            raise
+        self._fd = fd
+
+    def release(self) -> None:
+        assert self._fd is not None, f"Lock '{self.path}' is not acquired"
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+    def __enter__(self) -> FileLock:
+        self.acquire()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.release()
@@ -2,38 +2,57 @@ from __future__ import annotations
 from typing import List
 
 from pathlib import Path
-from urllib.request import urlretrieve
+from urllib.request import urlopen
 from urllib.error import HTTPError, URLError
 
 from vortex.utils.progress import DownloadBar
+from vortex.utils.run import check_cancelled
 
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def download(src_url: str, dst_path: Path) -> None:
+TIMEOUT = 60.0
+"Timeout of connection and of each read, in seconds."
+
+BLOCK_SIZE = 0x10000
+
+
+def download(src_url: str, dst_path: Path, quiet: bool = False) -> None:
+    "Downloads file checking between blocks whether the run is cancelled. Progress bar is not printed if `quiet`."
     logger.debug(f"downloading from '{src_url}' ...")
     bar = DownloadBar()
-    bar.print()
+    if not quiet:
+        bar.print()
     try:
-        urlretrieve(src_url, dst_path, bar.update_by_blocks_and_print)
-    except RuntimeError:
-        print(flush=True)
+        with urlopen(src_url, timeout=TIMEOUT) as response, open(dst_path, "wb") as f:
+            total = int(response.headers.get("Content-Length", "-1"))
+            size = 0
+            for block in iter(lambda: response.read1(BLOCK_SIZE), b""):
+                check_cancelled()
+                f.write(block)
+                size += len(block)
+                if not quiet:
+                    bar.update_by_blocks_and_print(1, size, total)
+    except BaseException:
+        if not quiet:
+            print(flush=True)
         dst_path.unlink(missing_ok=True)
         logger.warning(f"download failed")
         raise
-    bar.current_bytes = bar.total_bytes
-    bar.print()
-    print(flush=True)
+    if not quiet:
+        bar.current_bytes = bar.total_bytes
+        bar.print()
+        print(flush=True)
     logger.debug(f"downloaded to '{dst_path}'")
 
 
-def download_alt(src_urls: List[str], dst_path: Path) -> None:
+def download_alt(src_urls: List[str], dst_path: Path, quiet: bool = False) -> None:
     for url in src_urls:
         last_error = None
         try:
-            download(url, dst_path)
+            download(url, dst_path, quiet=quiet)
             break
         except (HTTPError, URLError) as e:
             last_error = e
@@ -1,6 +1,8 @@
 from __future__ import annotations
 from typing import List, Protocol, Sequence, TypeVar, Any
 
+import os
+import stat
 from pathlib import PurePath, Path
 
 Self = TypeVar("Self")
@@ -60,6 +62,20 @@ def prepend_if_target(target: Path, path: Path | TargetPath) -> Path:
         return path
 
 
+def runtime_dir() -> Path:
+    "Private directory of current user for sockets: `$XDG_RUNTIME_DIR/vortex` or `vortex-<uid>` in temp directory."
+    import tempfile
+
+    xdg = os.environ.get("XDG_RUNTIME_DIR")
+    path = Path(xdg, "vortex") if xdg else Path(tempfile.gettempdir(), f"vortex-{os.getuid()}")
+    path.mkdir(mode=0o700, exist_ok=True)
+    # Directory in shared location could be created in advance by other user.
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077 != 0:
+        raise RuntimeError(f"'{path}' must be a directory owned by current user and not accessible by others")
+    return path
+
+
 def _test(path: PathLike) -> None:
     pass
 
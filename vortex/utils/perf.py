@@ -0,0 +1,98 @@
+from __future__ import annotations
+from typing import Dict, List, Optional
+
+import re
+import shutil
+from pathlib import Path
+from collections import Counter
+
+from vortex.utils.run import run
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+DATA_FILE = "perf.data"
+FOLDED_FILE = "perf.folded"
+SVG_FILE = "flamegraph.svg"
+TOP_FILE = "top.txt"
+
+CALL_GRAPHS = ["fp", "dwarf", "lbr"]
+
+# Tools which render flame graph from folded stacks read from stdin.
+_FLAMEGRAPH_TOOLS = ["inferno-flamegraph", "flamegraph.pl", "flamegraph"]
+
+
+def record_args(data: Path, frequency: int, call_graph: str) -> List[str]:
+    "Prefix for command to be sampled by `perf record`."
+    assert call_graph in CALL_GRAPHS
+    return ["perf", "record", "-o", str(data), "-F", str(frequency), f"--call-graph={call_graph}", "--"]
+
+
+def _symbol(frame: str) -> str:
+    "Function name of `perf script` frame line, e.g. `7f00a1b2 foo+0x1c (/usr/lib/libfoo.so)`."
+    parts = frame.split(maxsplit=1)
+    if len(parts) < 2:
+        return "[unknown]"
+    symbol, _, dso = parts[1].rpartition(" (")
+    symbol = re.sub(r"\+0x[0-9a-f]+$", "", symbol)
+    if symbol in ("", "[unknown]"):
+        return f"[{Path(dso.rstrip(')')).name or 'unknown'}]"
+    return symbol
+
+
+def fold(script: str) -> Counter[str]:
+    "Converts output of `perf script` to folded stacks (root first, separated by `;`) with their sample counts."
+    stacks: Counter[str] = Counter()
+    for sample in re.split(r"\n\s*\n", script):
+        lines = [line for line in sample.splitlines() if line.strip() and not line.startswith("#")]
+        if len(lines) == 0:
+            continue
+        comm = lines[0].split(maxsplit=1)[0]
+        frames = [_symbol(line.strip()) for line in reversed(lines[1:])]
+        stacks[";".join([comm, *frames])] += 1
+    return stacks
+
+
+def top_symbols(stacks: Counter[str], count: int) -> List[str]:
+    "Symbols with the most samples on top of the stack."
+    total = sum(stacks.values())
+    leaves: Counter[str] = Counter()
+    for stack, samples in stacks.items():
+        leaves[stack.rsplit(";", 1)[-1]] += samples
+    return [f"{100.0 * n / total:6.2f}% {n:8} {symbol}" for symbol, n in leaves.most_common(count)]
+
+
+def _flamegraph(folded: Path, svg: Path) -> bool:
+    for tool in _FLAMEGRAPH_TOOLS:
+        path = shutil.which(tool)
+        if path is None:
+            continue
+        with open(folded, "rb") as input:
+            output = run([path], input=input.read(), capture=True)
+        assert output is not None
+        svg.write_text(output)
+        return True
+    logger.info(f"No flame graph tool found (one of {', '.join(_FLAMEGRAPH_TOOLS)}), SVG is not rendered")
+    return False
+
+
+def summarize(dir: Path, count: int = 20) -> Optional[List[str]]:
+    "Stores folded stacks, flame graph and top symbols next to perf data in `dir`. Returns the top symbols."
+    output = run(["perf", "script", "-i", dir / DATA_FILE], capture=True)
+    assert output is not None
+    stacks = fold(output)
+    if len(stacks) == 0:
+        return None
+    folded = dir / FOLDED_FILE
+    folded.write_text("".join([f"{stack} {n}\n" for stack, n in stacks.items()]))
+    _flamegraph(folded, dir / SVG_FILE)
+    top = top_symbols(stacks, count)
+    (dir / TOP_FILE).write_text("\n".join(top) + "\n")
+    return top
+
+
+def artifacts(dir: Path) -> Dict[str, Path]:
+    "Existing results of `summarize`."
+    return {name: dir / name for name in [DATA_FILE, FOLDED_FILE, SVG_FILE, TOP_FILE] if (dir / name).exists()}
@@ -0,0 +1,84 @@
+from __future__ import annotations
+from typing import Generator, List, Tuple
+
+import re
+import io
+import pstats
+import cProfile
+import threading
+from time import strftime
+from pathlib import Path
+from contextlib import contextmanager
+
+# Functions in which Python waits for child processes and other threads rather than doing its own work.
+_WAITS = [
+    "<built-in method time.sleep>",
+    "<built-in method posix.wait4>",
+    "<built-in method posix.waitpid>",
+    "<built-in method posix.read>",
+    "<built-in method select.select>",
+    "<method 'acquire' of '_thread.lock' objects>",
+    "<method 'acquire' of '_thread.RLock' objects>",
+]
+
+
+class PyProfiler:
+    "Deterministic profiler of Python code in all threads it is enabled in."
+
+    def __init__(self) -> None:
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def thread(self) -> Generator[None, None, None]:
+        "Profiles current thread within the context."
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Since Python 3.12 only one profiler can be active in the process, and it sees all threads anyway.
+            yield
+            return
+        with self._lock:
+            self._profiles.append(profile)
+        try:
+            yield
+        finally:
+            profile.disable()
+
+    def stats(self) -> pstats.Stats:
+        "Merged statistics of all threads."
+        with self._lock:
+            profiles = [p for p in self._profiles if len(p.getstats()) > 0]
+        if len(profiles) == 0:
+            raise ValueError("Nothing is profiled")
+        stats = pstats.Stats(profiles[0], stream=io.StringIO())
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def save(self, dir: Path, name: str) -> Path:
+        "Stores statistics in pstats format, e.g. for `snakeviz` or `gprof2dot`."
+        dir.mkdir(parents=True, exist_ok=True)
+        safe = re.sub(r"[^\w.-]+", "_", name)
+        path = dir / f"{strftime('%Y%m%d-%H%M%S')}-{safe}.pstats"
+        self.stats().dump_stats(path)
+        return path
+
+    def split(self) -> Tuple[float, float]:
+        "Total time of profiled threads and part of it spent waiting for processes and other threads."
+        entries = self.stats().stats  # type: ignore[attr-defined]
+        total = sum([tt for _, _, tt, _, _ in entries.values()])
+        waits = sum([tt for (_, _, name), (_, _, tt, _, _) in entries.items() if name in _WAITS])
+        return (total, waits)
+
+    def top(self, count: int = 20) -> str:
+        "Functions which take the most of their own time except waiting ones."
+        stats = self.stats()
+        entries = stats.stats  # type: ignore[attr-defined]
+        for key in [k for k in entries if k[2] in _WAITS]:
+            del entries[key]
+        out = io.StringIO()
+        stats.stream = out  # type: ignore[attr-defined]
+        stats.sort_stats(pstats.SortKey.TIME).print_stats(count)
+        return out.getvalue()
@@ -0,0 +1,134 @@
+from __future__ import annotations
+from typing import Dict, List, TYPE_CHECKING
+
+import os
+import re
+import shutil
+from hashlib import sha256
+from pathlib import Path
+
+if TYPE_CHECKING:
+    import tarfile
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+KEY_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+TIMEOUT = 60.0
+"Timeout of single request to cache server, in seconds."
+
+
+def fingerprint(*parts: str) -> str:
+    "Cache key made of strings identifying task inputs."
+    digest = sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def tree_digest(path: Path) -> str:
+    "Hash of names, permissions and contents of all files in the tree (except `.git`)."
+    digest = sha256()
+    if path.is_file():
+        with open(path, "rb") as f:
+            digest.update(f.read())
+        return digest.hexdigest()
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted([d for d in dirnames if d != ".git"])
+        for name in sorted(filenames):
+            file = Path(dirpath, name)
+            digest.update(f"{file.relative_to(path)}\0{os.lstat(file).st_mode & 0o111}\0".encode())
+            if file.is_symlink():
+                digest.update(os.readlink(file).encode())
+            else:
+                with open(file, "rb") as f:
+                    for chunk in iter(lambda: f.read(0x100000), b""):
+                        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _safe_members(archive: tarfile.TarFile, labels: List[str]) -> List[tarfile.TarInfo]:
+    "Members of archive which are extracted inside of directories named by `labels`."
+    members = archive.getmembers()
+    for m in members:
+        parts = Path(m.name).parts
+        if os.path.isabs(m.name) or ".." in parts or len(parts) == 0 or parts[0] not in labels:
+            raise ValueError(f"Unexpected path in cached archive: '{m.name}'")
+        if m.islnk():
+            target = m.linkname
+        elif m.issym():
+            target = os.path.normpath(os.path.join(os.path.dirname(m.name), m.linkname))
+        else:
+            continue
+        if os.path.isabs(target) or target.startswith(".."):
+            raise ValueError(f"Unexpected link in cached archive: '{m.name}' -> '{m.linkname}'")
+    return members
+
+
+class RemoteCache:
+    "Client of content-addressed HTTP cache of task outputs: gzipped tarball is stored at `<url>/<key>` by `PUT`."
+
+    def __init__(self, url: str) -> None:
+        self.url = url.rstrip("/")
+
+    def pull(self, key: str, paths: Dict[str, Path]) -> bool:
+        "Replaces `paths` with outputs stored under `key`. Returns `False` if there is no such entry."
+        # Archive and network modules are imported only when cache is used, they are slow to import.
+        import tarfile
+        import tempfile
+        from urllib.request import urlopen
+        from urllib.error import HTTPError
+
+        assert KEY_PATTERN.match(key)
+        # Staging directory is placed next to outputs to move them into place without copying.
+        parent = next(iter(paths.values())).parent
+        parent.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=".pull-", dir=parent))
+        try:
+            with tempfile.TemporaryFile() as tmp:
+                try:
+                    with urlopen(f"{self.url}/{key}", timeout=TIMEOUT) as response:
+                        shutil.copyfileobj(response, tmp)
+                except HTTPError as e:
+                    if e.code == 404:
+                        return False
+                    raise
+                tmp.seek(0)
+                with tarfile.open(fileobj=tmp, mode="r:gz") as archive:
+                    members = _safe_members(archive, list(paths.keys()))
+                    # Pythons before 3.12 (and its backports) lack extraction filter, there members are only checked.
+                    if hasattr(tarfile, "data_filter"):
+                        archive.extractall(staging, members=members, filter="data")
+                    else:
+                        archive.extractall(staging, members=members)
+            for label, path in paths.items():
+                if path.exists():
+                    shutil.rmtree(path)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                shutil.move(str(staging / label), path)
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        logger.info(f"Pulled {key} from {self.url}")
+        return True
+
+    def push(self, key: str, paths: Dict[str, Path]) -> None:
+        "Stores `paths` under `key`."
+        import tarfile
+        import tempfile
+        from urllib.request import Request, urlopen
+
+        assert KEY_PATTERN.match(key)
+        with tempfile.TemporaryFile() as tmp:
+            with tarfile.open(fileobj=tmp, mode="w:gz") as archive:
+                for label, path in paths.items():
+                    archive.add(path, arcname=label)
+            size = tmp.tell()
+            tmp.seek(0)
+            request = Request(f"{self.url}/{key}", data=tmp, method="PUT", headers={"Content-Length": str(size)})
+            with urlopen(request, timeout=TIMEOUT):
+                pass
+        logger.info(f"Pushed {key} to {self.url} ({size} bytes)")
@@ -1,26 +1,229 @@
 from __future__ import annotations
-from typing import Sequence, Mapping, List, Dict, Optional, Callable
+from typing import Any, Sequence, Mapping, List, Dict, Optional, Callable, IO, Generator, Tuple, TypeVar
 
 import os
 import sys
-from subprocess import Popen, PIPE, STDOUT, CalledProcessError
+import signal
+import resource
+import threading
+from threading import Thread
+from dataclasses import dataclass
+from contextlib import contextmanager
+from subprocess import Popen, PIPE, STDOUT, CalledProcessError, TimeoutExpired
 from pathlib import Path
 from enum import Enum
-from time import time, sleep
+from time import time, sleep, perf_counter
 
 from vortex.utils.path import PathLike
 
 RunError = CalledProcessError
 
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class RunCancelled(RuntimeError):
+    "Process was stopped because the run was cancelled."
+
+
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+POLL_INTERVAL = 0.05
+"Interval of checking whether the process should be stopped, in seconds."
+
+KILL_TIMEOUT = 0.4
+"Time given to process group to exit after SIGTERM before it is killed with SIGKILL, in seconds."
+
+
+# Process is made a leader of a new group, so that it can be stopped together with its children.
+# Unlike a new session, the group keeps controlling terminal, e.g. for password prompts.
+_NEW_GROUP: Dict[str, Any]
+if sys.version_info >= (3, 11):
+    _NEW_GROUP = {"process_group": 0}
+else:
+    _NEW_GROUP = {"preexec_fn": os.setpgrp}
+
+
+_scope = threading.local()
+
+
+@contextmanager
+def cancel_scope(alive: Callable[[], bool]) -> Generator[None, None, None]:
+    "Processes started by `run` in current thread without explicit `alive` are stopped once `alive` returns `False`."
+    prev = getattr(_scope, "alive", None)
+    _scope.alive = alive
+    try:
+        yield
+    finally:
+        _scope.alive = prev
+
+
+def check_cancelled() -> None:
+    "Raises `RunCancelled` if cancel scope of current thread is stopped. For long operations which are not processes."
+    alive = getattr(_scope, "alive", None)
+    if alive is not None and not alive():
+        raise RunCancelled("Run is cancelled")
+
+
+@dataclass
+class ProcessUsage:
+    "Resources used by process and its children."
+
+    user: float = 0.0
+    "User CPU time, in seconds."
+    system: float = 0.0
+    "System CPU time, in seconds."
+    max_rss: int = 0
+    "Peak resident memory of the largest process, in bytes."
+    in_blocks: int = 0
+    out_blocks: int = 0
+    switches: int = 0
+    "Voluntary context switches, i.e. waits for I/O or other processes."
+    preemptions: int = 0
+    "Involuntary context switches."
+
+    @staticmethod
+    def from_rusage(usage: resource.struct_rusage) -> ProcessUsage:
+        return ProcessUsage(
+            user=usage.ru_utime,
+            system=usage.ru_stime,
+            max_rss=usage.ru_maxrss * 1024,
+            in_blocks=usage.ru_inblock,
+            out_blocks=usage.ru_oublock,
+            switches=usage.ru_nvcsw,
+            preemptions=usage.ru_nivcsw,
+        )
+
+    @property
+    def cpu(self) -> float:
+        return self.user + self.system
+
+    def add(self, other: ProcessUsage) -> None:
+        "Accumulates usage of processes run one after another."
+        self.user += other.user
+        self.system += other.system
+        self.max_rss = max(self.max_rss, other.max_rss)
+        self.in_blocks += other.in_blocks
+        self.out_blocks += other.out_blocks
+        self.switches += other.switches
+        self.preemptions += other.preemptions
+
+    def __str__(self) -> str:
+        return ", ".join(
+            [
+                f"cpu {self.user:.2f} s user + {self.system:.2f} s sys",
+                f"max rss {self.max_rss / 0x100000:.0f} MiB",
+                f"block io {self.in_blocks} in / {self.out_blocks} out",
+                f"context switches {self.switches} voluntary / {self.preemptions} involuntary",
+            ]
+        )
+
+
+@contextmanager
+def usage_scope(sink: Callable[[ProcessUsage], None]) -> Generator[None, None, None]:
+    "Resource usage of each process finished by `run` in current thread is passed to `sink`."
+    prev = getattr(_scope, "usage", None)
+    _scope.usage = sink
+    try:
+        yield
+    finally:
+        _scope.usage = prev
+
+
+def inherit_scopes(func: Callable[[T], R]) -> Callable[[T], R]:
+    "Wraps `func` to run in cancel and usage scopes of current thread, e.g. by workers of thread pool."
+    alive = getattr(_scope, "alive", None)
+    sink = getattr(_scope, "usage", None)
+
+    def wrapper(arg: T) -> R:
+        with cancel_scope(alive or (lambda: True)), usage_scope(sink or (lambda u: None)):
+            return func(arg)
+
+    return wrapper
+
+
 class RunMode(Enum):
     NORMAL = 0
     DEBUGGER = 1
     PROFILER = 2
+    MEMORY = 3
+
+
+class _Reader(Thread):
+    "Drains process pipe in background so that the process is not blocked on full pipe buffer."
+
+    def __init__(self, stream: IO[bytes]) -> None:
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.data = bytearray()
+        self.start()
+
+    def run(self) -> None:
+        while True:
+            chunk = self.stream.read(0x10000)
+            if not chunk:
+                break
+            self.data.extend(chunk)
+
+
+def _signal_group(pgid: int, sig: int) -> bool:
+    "Returns `False` if there are no processes in group."
+    try:
+        os.killpg(pgid, sig)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def _wait_group(proc: Popen[bytes], timeout: float) -> bool:
+    "Waits until all processes in group of `proc` exit. Returns `False` on timeout."
+    deadline = time() + timeout
+    while time() < deadline:
+        # `poll` reaps the leader, otherwise the group still exists while the leader is a zombie.
+        if proc.poll() is not None and not _signal_group(proc.pid, 0):
+            return True
+        sleep(0.01)
+    return False
+
+
+def _kill_group(proc: Popen[bytes], group: bool = True, timeout: float = KILL_TIMEOUT) -> None:
+    "Stops all processes in group of `proc` (if it is a group leader) including its grandchildren."
+    if not group:
+        proc.terminate()
+        try:
+            proc.wait(timeout)
+        except TimeoutExpired:
+            proc.kill()
+            proc.wait()
+        return
+    if _signal_group(proc.pid, signal.SIGTERM) and not _wait_group(proc, timeout):
+        # SIGKILL cannot be ignored, so there is no need to wait for the whole group.
+        _signal_group(proc.pid, signal.SIGKILL)
+    proc.wait()
+
+
+def _wait(proc: Popen[bytes], timeout: float) -> Optional[ProcessUsage]:
+    "Like `Popen.wait` but also returns resource usage of the process. Returns `None` on timeout."
+    deadline = time() + timeout
+    delay = 0.0005
+    while True:
+        try:
+            pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+        except ChildProcessError:
+            # Process is already reaped, so its usage is lost.
+            proc.wait()
+            return ProcessUsage()
+        if pid != 0:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return ProcessUsage.from_rusage(usage)
+        remaining = deadline - time()
+        if remaining <= 0.0:
+            return None
+        delay = min(delay * 2, remaining, POLL_INTERVAL)
+        sleep(delay)
 
 
 def run(
@@ -33,13 +236,24 @@ def run(
     quiet: bool = False,
     timeout: Optional[float] = None,
     mode: RunMode = RunMode.NORMAL,
-    alive: Callable[[], bool] = lambda: True,
+    alive: Optional[Callable[[], bool]] = None,
+    usage: Optional[Callable[[ProcessUsage], None]] = None,
+    keep_output: bool = False,
+    interactive: bool = False,
 ) -> Optional[str]:
+    "Runs process. Its usage is passed to `usage` and to `usage_scope`. Output of failed process is kept in error if requested."
+    if alive is None:
+        alive = getattr(_scope, "alive", None) or (lambda: True)
+
     x_args = [str(a) for a in args]
     if mode == RunMode.DEBUGGER:
         x_args = ["gdb", "-batch", "-ex", "run", "-ex", "bt", "-args"] + x_args
     elif mode == RunMode.PROFILER:
         x_args = ["perf", "record"] + x_args
+    elif mode == RunMode.MEMORY:
+        from vortex.utils.heap import record_args
+
+        x_args = record_args() + x_args
     else:
         assert mode == RunMode.NORMAL
 
@@ -58,6 +272,9 @@ def run(
 
     logger.debug(f"Starting process: {x_args}, cwd={cwd}, env={env}")
     done = False
+    # Interactive process and debugger stay in foreground group of the terminal to read input and receive Ctrl-C,
+    # so only the process itself is stopped on cancel, not its children.
+    group = not interactive and mode != RunMode.DEBUGGER
     proc = Popen(
         x_args,
         cwd=cwd,
@@ -65,44 +282,106 @@ def run(
         stdin=stdin,
         stdout=stdout,
         stderr=stderr,
+        **(_NEW_GROUP if group else {}),
     )
+    out_reader = _Reader(proc.stdout) if proc.stdout is not None else None
+    err_reader = _Reader(proc.stderr) if proc.stderr is not None else None
 
     try:
         start = time()
         while alive():
-            sleep(0.1)
-            ret = proc.poll()
-            if ret is not None:
-                if ret != 0:
-                    raise CalledProcessError(ret, x_args)
-                done = True
-                break
-            if timeout is not None and timeout < time() - start:
-                raise TimeoutError
             if input is not None and len(input) > 0:
                 assert proc.stdin is not None
                 input = input[proc.stdin.write(input) :]
                 if len(input) == 0:
                     proc.stdin.close()
-    except:
-        if capture or quiet:
-            assert proc.stdout is not None
-            sys.stdout.buffer.write(proc.stdout.read())
-            assert proc.stderr is not None
-            sys.stderr.buffer.write(proc.stderr.read())
+            used = _wait(proc, POLL_INTERVAL)
+            if used is None:
+                if timeout is not None and timeout < time() - start:
+                    raise TimeoutError
+                continue
+            logger.debug(f"Process finished: {x_args}: {used}")
+            for sink in [getattr(_scope, "usage", None), usage]:
+                if sink is not None:
+                    sink(used)
+            ret = proc.returncode
+            if ret != 0:
+                raise CalledProcessError(ret, x_args)
+            done = True
+            break
+    except BaseException as e:
+        _kill_group(proc, group)
+        logger.debug(f"Process killed: {x_args}")
+        if out_reader is not None:
+            out_reader.join(0.1)
+            # Caller prints it itself, e.g. together with output of other failed processes.
+            if keep_output and isinstance(e, CalledProcessError):
+                e.output = out_reader.data.decode("utf-8", errors="replace")
+            else:
+                sys.stdout.buffer.write(out_reader.data)
+        if err_reader is not None:
+            err_reader.join(0.1)
+            sys.stderr.buffer.write(err_reader.data)
         raise
 
     if not done:
-        proc.terminate()
-        logger.debug(f"Process terminated: {x_args}")
+        _kill_group(proc, group)
+        logger.debug(f"Process killed: {x_args}")
+        raise RunCancelled(f"Process cancelled: {x_args}")
 
     if capture:
-        assert proc.stdout is not None
-        return proc.stdout.read().decode("utf-8")
+        assert out_reader is not None
+        out_reader.join()
+        return out_reader.data.decode("utf-8")
     else:
         return None
 
 
+def run_timed(
+    args: Sequence[str | PathLike],
+    cwd: Optional[Path] = None,
+    env: Mapping[str, str | Path] = {},
+) -> Tuple[float, ProcessUsage]:
+    "Runs process quietly and returns its exact wall time. Unlike `run`, exit is waited by blocking `wait4`, not polled."
+    import tempfile
+
+    x_args = [str(a) for a in args]
+    x_env = {**dict(os.environ), **{k: str(v) for k, v in env.items()}}
+    alive = getattr(_scope, "alive", None) or (lambda: True)
+    exit: List[Tuple[float, int, resource.struct_rusage]] = []
+
+    with tempfile.TemporaryFile() as out:
+        start = perf_counter()
+        proc = Popen(x_args, cwd=cwd, env=x_env, stdout=out, stderr=STDOUT, **_NEW_GROUP)
+
+        def wait() -> None:
+            _, status, usage = os.wait4(proc.pid, 0)
+            exit.append((perf_counter(), status, usage))
+
+        # Waiting thread wakes up right at exit, while this one checks for cancellation.
+        waiter = Thread(target=wait, daemon=True)
+        waiter.start()
+        while waiter.is_alive() and alive():
+            waiter.join(POLL_INTERVAL)
+        if waiter.is_alive():
+            _signal_group(proc.pid, signal.SIGKILL)
+            waiter.join()
+            raise RunCancelled(f"Process cancelled: {x_args}")
+
+        end, status, rusage = exit[0]
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        used = ProcessUsage.from_rusage(rusage)
+        sink = getattr(_scope, "usage", None)
+        if sink is not None:
+            sink(used)
+        if proc.returncode != 0:
+            out.seek(0)
+            sys.stdout.buffer.write(out.read())
+            sys.stdout.flush()
+            raise CalledProcessError(proc.returncode, x_args)
+    return (end - start, used)
+
+
 def capture(
     args: List[str | Path],
     cwd: Optional[Path] = None,
@@ -0,0 +1,285 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import os
+import json
+import stat
+import shutil
+import tempfile
+from time import time
+from hashlib import sha256
+from pathlib import Path, PurePosixPath
+from dataclasses import dataclass, field, asdict
+
+from vortex.utils.run import run
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+CHUNK_SIZE = 4 * 0x100000
+"Files are split into chunks of this size, so that only changed parts of large files are stored again."
+
+BATCH = 256
+"Number of chunks (de)compressed by single `zstd` process."
+
+
+class Codec:
+    "Zstandard compression of files by `zstandard` module if it is installed, otherwise by `zstd` command in batches."
+
+    def __init__(self, level: int = 3) -> None:
+        self.level = level
+        self.module: Any = None
+        try:
+            import zstandard  # type: ignore
+
+            self.module = zstandard
+        except ImportError:
+            if shutil.which("zstd") is None:
+                raise RuntimeError("Neither `zstandard` Python module nor `zstd` command is installed")
+
+    def compress(self, paths: List[Path]) -> None:
+        "Replaces each of `paths` with compressed `<path>.zst`."
+        if len(paths) == 0:
+            return
+        if self.module is None:
+            run(["zstd", "-q", "-f", "--rm", f"-{self.level}", *paths])
+            return
+        compressor = self.module.ZstdCompressor(level=self.level)
+        for path in paths:
+            with open(path, "rb") as src, open(f"{path}.zst", "wb") as dst:
+                compressor.copy_stream(src, dst)
+            path.unlink()
+
+    def decompress(self, paths: List[Path], dst_dir: Path) -> None:
+        "Decompresses each of `*.zst` files from `paths` into `dst_dir` without the extension."
+        if len(paths) == 0:
+            return
+        if self.module is None:
+            run(["zstd", "-d", "-q", "-f", "--output-dir-flat", dst_dir, *paths])
+            return
+        decompressor = self.module.ZstdDecompressor()
+        for path in paths:
+            with open(path, "rb") as src, open(dst_dir / path.stem, "wb") as dst:
+                decompressor.copy_stream(src, dst)
+
+
+@dataclass
+class Entry:
+    path: str
+    "Path relative to root of snapshot, in POSIX form."
+    kind: str
+    "One of `file`, `dir` or `link`."
+    mode: int
+    mtime: int
+    "Modification time, in nanoseconds."
+    size: int = 0
+    chunks: List[str] = field(default_factory=list)
+    target: str = ""
+    "Target of symbolic link."
+
+
+class ChunkStore:
+    "Deduplicated content of snapshots: `chunks/` of compressed file pieces named by their hash and `snapshots/*.json`."
+
+    def __init__(self, root: Path, codec: Optional[Codec] = None) -> None:
+        self.root = root
+        self.codec = codec or Codec()
+        self._pending: List[Path] = []
+
+    def _chunk(self, key: str) -> Path:
+        return self.root / "chunks" / key[:2] / f"{key}.zst"
+
+    def manifest(self, name: str) -> Path:
+        return self.root / "snapshots" / f"{name}.json"
+
+    def has(self, key: str) -> bool:
+        return self._chunk(key).exists()
+
+    def put(self, data: bytes) -> str:
+        key = sha256(data).hexdigest()
+        path = self._chunk(key)
+        raw = path.with_suffix("")
+        # Leftover of interrupted snapshot is written again.
+        if path.exists() or raw in self._pending:
+            return key
+        raw.parent.mkdir(parents=True, exist_ok=True)
+        raw.write_bytes(data)
+        self._pending.append(raw)
+        if len(self._pending) >= BATCH:
+            self.flush()
+        return key
+
+    def flush(self) -> None:
+        self.codec.compress(self._pending)
+        self._pending = []
+
+    def fetch(self, keys: List[str], dst_dir: Path) -> None:
+        "Decompresses chunks into `dst_dir` as files named by their keys."
+        self.codec.decompress([self._chunk(k) for k in keys], dst_dir)
+
+    def prune(self) -> int:
+        "Removes chunks not referenced by any snapshot. Returns number of removed chunks."
+        used: Set[str] = set()
+        for path in (self.root / "snapshots").glob("*.json"):
+            used.update([k for e in load_manifest(path)["entries"] for k in e["chunks"]])
+        removed = 0
+        for path in (self.root / "chunks").glob("*/*.zst"):
+            if path.stem not in used:
+                path.unlink()
+                removed += 1
+        return removed
+
+
+def load_manifest(path: Path) -> Dict[str, Any]:
+    with open(path, "r") as f:
+        manifest: Dict[str, Any] = json.load(f)
+    return manifest
+
+
+def _walk(root: Path, exclude: List[PurePosixPath]) -> Iterator[Path]:
+    "All paths in tree, parents before children."
+    for dirpath, dirnames, filenames in os.walk(root):
+        rel = PurePosixPath(Path(dirpath).relative_to(root).as_posix())
+        dirnames[:] = sorted([d for d in dirnames if rel / d not in exclude])
+        for name in [*dirnames, *sorted(filenames)]:
+            if rel / name not in exclude:
+                yield Path(dirpath, name)
+
+
+def store_tree(root: Path, store: ChunkStore, name: str, exclude: List[PurePosixPath] = []) -> Dict[str, int]:
+    "Stores tree at `root`. Files which size and mtime are the same as in previous snapshot are not read again."
+    previous: Dict[str, Entry] = {}
+    if store.manifest(name).exists():
+        previous = {e["path"]: Entry(**e) for e in load_manifest(store.manifest(name))["entries"]}
+
+    entries: List[Entry] = []
+    stats = {"files": 0, "reused": 0, "chunks": 0, "bytes": 0}
+    for path in _walk(root, exclude):
+        st = os.lstat(path)
+        rel = path.relative_to(root).as_posix()
+        if stat.S_ISLNK(st.st_mode):
+            entries.append(Entry(rel, "link", 0, st.st_mtime_ns, target=os.readlink(path)))
+        elif stat.S_ISDIR(st.st_mode):
+            entries.append(Entry(rel, "dir", stat.S_IMODE(st.st_mode), st.st_mtime_ns))
+        elif stat.S_ISREG(st.st_mode):
+            stats["files"] += 1
+            entry = Entry(rel, "file", stat.S_IMODE(st.st_mode), st.st_mtime_ns, st.st_size)
+            prev = previous.get(rel)
+            if (
+                prev is not None
+                and (prev.size, prev.mtime) == (st.st_size, st.st_mtime_ns)
+                and all(map(store.has, prev.chunks))
+            ):
+                entry.chunks = prev.chunks
+                stats["reused"] += 1
+            else:
+                with open(path, "rb") as f:
+                    for data in iter(lambda: f.read(CHUNK_SIZE), b""):
+                        entry.chunks.append(store.put(data))
+                        stats["chunks"] += 1
+                        stats["bytes"] += len(data)
+            entries.append(entry)
+        else:
+            logger.debug(f"Skipping special file '{path}'")
+    store.flush()
+
+    path = store.manifest(name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, "w") as f:
+        json.dump({"root": str(root), "time": time(), "entries": [asdict(e) for e in entries]}, f)
+    os.replace(tmp, path)
+    return stats
+
+
+def _write_files(root: Path, store: ChunkStore, entries: List[Entry]) -> None:
+    keys = sorted({k for e in entries for k in e.chunks})
+    with tempfile.TemporaryDirectory(dir=root) as tmp:
+        store.fetch(keys, Path(tmp))
+        for e in entries:
+            path = root / e.path
+            part = path.with_name(f".{path.name}.restore")
+            with open(part, "wb") as dst:
+                for key in e.chunks:
+                    with open(Path(tmp, key), "rb") as src:
+                        shutil.copyfileobj(src, dst)
+            os.chmod(part, e.mode)
+            os.replace(part, path)
+            os.utime(path, ns=(e.mtime, e.mtime))
+
+
+def _kind(st: os.stat_result) -> str:
+    if stat.S_ISLNK(st.st_mode):
+        return "link"
+    if stat.S_ISDIR(st.st_mode):
+        return "dir"
+    if stat.S_ISREG(st.st_mode):
+        return "file"
+    return "other"
+
+
+def _remove_extra(root: Path, entries: List[Entry], exclude: List[PurePosixPath]) -> int:
+    "Removes paths which are not in snapshot or have other type there. Returns number of removed paths."
+    kinds = {e.path: e.kind for e in entries}
+    # Directories containing excluded paths are kept even if they are not in snapshot.
+    protected = {str(p) for e in exclude for p in e.parents}
+    removed = 0
+    for path in reversed(list(_walk(root, exclude))):
+        rel = path.relative_to(root).as_posix()
+        kind = _kind(os.lstat(path))
+        if kinds.get(rel) == kind or (kind == "dir" and rel in protected):
+            continue
+        if kind == "dir":
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+        removed += 1
+    return removed
+
+
+def restore_tree(root: Path, store: ChunkStore, name: str, exclude: List[PurePosixPath] = []) -> Dict[str, int]:
+    "Makes tree at `root` the same as snapshot except `exclude` paths. Files which are already the same are kept."
+    manifest = load_manifest(store.manifest(name))
+    entries = [Entry(**e) for e in manifest["entries"]]
+    stats = {"files": 0, "kept": 0, "removed": 0}
+
+    root.mkdir(parents=True, exist_ok=True)
+    stats["removed"] = _remove_extra(root, entries, exclude)
+    batch: List[Entry] = []
+    for e in entries:
+        path = root / e.path
+        if e.kind == "dir":
+            path.mkdir(exist_ok=True)
+        elif e.kind == "link":
+            if path.is_symlink():
+                path.unlink()
+            os.symlink(e.target, path)
+            os.utime(path, ns=(e.mtime, e.mtime), follow_symlinks=False)
+        else:
+            stats["files"] += 1
+            try:
+                st = os.lstat(path)
+                if stat.S_ISREG(st.st_mode) and (st.st_size, st.st_mtime_ns) == (e.size, e.mtime):
+                    stats["kept"] += 1
+                    continue
+            except FileNotFoundError:
+                pass
+            batch.append(e)
+            if sum([len(b.chunks) for b in batch]) >= BATCH:
+                _write_files(root, store, batch)
+                batch = []
+    _write_files(root, store, batch)
+
+    # Directories are modified by restoring their content, so their mtimes are set last, children first.
+    for e in reversed(entries):
+        if e.kind == "dir":
+            os.chmod(root / e.path, e.mode)
+            os.utime(root / e.path, ns=(e.mtime, e.mtime))
+    if manifest["root"] != str(root):
+        logger.warning(
+            f"Snapshot is taken from '{manifest['root']}', so freshness state of tasks is not valid in '{root}' "
+            + "and they will be rebuilt"
+        )
+    return stats
@@ -3,3 +3,12 @@ from __future__ import annotations
 
 def quote(text: str, char: str = '"') -> str:
     return char + text.replace("\\", "\\\\").replace(char, "\\" + char) + char
+
+
+def parse_size(text: str) -> int:
+    "Parses size in bytes with optional binary suffix, e.g. `512M` or `16G`."
+    text = text.strip().upper().removesuffix("B").removesuffix("I")
+    for i, suffix in enumerate("KMGT"):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * 1024 ** (i + 1))
+    return int(text)